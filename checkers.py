@@ -1,10 +1,28 @@
 import argparse
-import copy
+import asyncio
+import hashlib
+import json
+import math
+import mmap
+import multiprocessing
+import os
+import random
+import re
+import sqlite3
+import struct
 import sys
+import threading
 import time
-from copy import deepcopy
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+try:
+    import numpy as np
+except ImportError:  # only --batch-eval and batch_eval() need numpy
+    np = None
 
-cache = {}  # you can use this to implement state caching!
 terminal_checker = {}  # key is the evaluation value and value is the state
 Board = [
     ['.', 'b', '.', 'b', '.', 'b', '.', 'b'],
@@ -35,24 +53,275 @@ score_board1 = [[2.2, 2.1, 2.1, 0.5, 0.5, 2.1, 2.1, 2.2],
 player = ['r', 'R']
 computer = ['b', 'B']
 walkthrough = []
+# where record() streams the game, None to keep it in walkthrough
+game_writer = None
+
+# Bitboard geometry. The 32 playable (dark) squares are numbered 0..31 in
+# the same row-major order get_pieces scans the board, so iterating the set
+# bits of a mask from low to high visits pieces in exactly that order.
+SQUARE_XY = [(2 * (sq % 4) + 1 - (sq // 4) % 2, sq // 4) for sq in range(32)]
+XY_SQUARE = {xy: sq for sq, xy in enumerate(SQUARE_XY)}
+# the same direction order slide and jump_helper use
+DIRECTIONS = [(1, -1), (-1, -1), (1, 1), (-1, 1)]
+RED_MAN_DIRS = (0, 1)
+BLACK_MAN_DIRS = (2, 3)
+KING_DIRS = (0, 1, 2, 3)
+# STEP[sq][d] is the neighbour of sq in direction d, JUMP_OVER/JUMP_TO the
+# jumped and landing squares of a jump in direction d, -1 when off the board
+STEP = [[XY_SQUARE.get((x + dx, y + dy), -1) for dx, dy in DIRECTIONS]
+        for x, y in SQUARE_XY]
+JUMP_OVER = STEP
+JUMP_TO = [[XY_SQUARE.get((x + 2 * dx, y + 2 * dy), -1)
+            for dx, dy in DIRECTIONS] for x, y in SQUARE_XY]
+# The same geometry for the list of lists board, indexed by y * 8 + x over
+# all 64 squares: the squares each kind of piece can slide to, and the
+# (jumped, landing) squares of its jumps, in direction order and already
+# clipped to the board. DIAGONALS holds every diagonal neighbour.
+PIECE_DIRS = {'r': RED_MAN_DIRS, 'b': BLACK_MAN_DIRS, 'R': KING_DIRS,
+              'B': KING_DIRS}
+SLIDES = {piece: [tuple((x + DIRECTIONS[d][0], y + DIRECTIONS[d][1])
+                        for d in dirs
+                        if 0 <= x + DIRECTIONS[d][0] < 8 and
+                        0 <= y + DIRECTIONS[d][1] < 8)
+                  for y in range(8) for x in range(8)]
+          for piece, dirs in PIECE_DIRS.items()}
+JUMPS = {piece: [tuple(((x + DIRECTIONS[d][0], y + DIRECTIONS[d][1]),
+                        (x + 2 * DIRECTIONS[d][0], y + 2 * DIRECTIONS[d][1]))
+                       for d in dirs
+                       if 0 <= x + 2 * DIRECTIONS[d][0] < 8 and
+                       0 <= y + 2 * DIRECTIONS[d][1] < 8)
+                 for y in range(8) for x in range(8)]
+         for piece, dirs in PIECE_DIRS.items()}
+DIAGONALS = SLIDES['R']
+# NEIGHBOUR_MASK[sq] has the diagonal neighbours of sq set
+NEIGHBOUR_MASK = [sum(1 << n for n in neighbours if n >= 0)
+                  for neighbours in STEP]
+RED_KING_ROW = 0x0000000F
+BLACK_KING_ROW = 0xF0000000
+
+# Zobrist keys, one per (piece, square of the 8*8 board) plus one for black
+# to move. The generator is seeded so keys are the same in every run.
+_zobrist_random = random.Random(20230424)
+ZOBRIST = {piece: [_zobrist_random.getrandbits(64) for _ in range(64)]
+           for piece in 'rRbB'}
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+# the same keys indexed by mask (r, R, b, B) and playable square
+BIT_ZOBRIST = [[ZOBRIST[piece][y * 8 + x] for x, y in SQUARE_XY]
+               for piece in 'rRbB']
+# Weights of eval(), every term from red's point of view. A piece
+# outside the centre loses edge times its distance from column 3 off the
+# centre weight, and gains advance for each row it is from the bottom.
+# unsafe and backed count for a piece that can be jumped, or that cannot
+# and has friendly men behind it, see is_safe_r and is_enhance_r.
+# --eval-weights loads fitted values over these, see load_eval_weights
+# and tune.py.
+man_value = 1
+king_value = 2.5
+red_man_unsafe = -2
+red_man_backed = 8
+red_man_advance = 0.5
+red_man_center = 7
+red_man_edge = 1
+red_man_crowning = 2.5  # a red man on the king row, not crowned yet
+red_king_unsafe = -5
+red_king_center = 10.5
+red_king_edge = 0.75
+red_king_advance = 0.5
+red_king_square = 1  # times score_board1
+black_man_unsafe = 2
+black_man_backed = -5.5
+black_man_advance = -0.5
+black_man_center = -7
+black_man_edge = -0.5
+black_man_crowning = 2.5
+black_king_unsafe = -5
+black_king_center = -10.5
+black_king_edge = -0.75
+black_king_advance = -0.5
+EVAL_WEIGHT_NAMES = (
+    'man_value', 'king_value', 'red_man_unsafe', 'red_man_backed',
+    'red_man_advance', 'red_man_center', 'red_man_edge', 'red_man_crowning',
+    'red_king_unsafe', 'red_king_center', 'red_king_edge',
+    'red_king_advance', 'red_king_square', 'black_man_unsafe',
+    'black_man_backed', 'black_man_advance', 'black_man_center',
+    'black_man_edge', 'black_man_crowning', 'black_king_unsafe',
+    'black_king_center', 'black_king_edge', 'black_king_advance')
+DEFAULT_EVAL_WEIGHTS = {name: globals()[name] for name in EVAL_WEIGHT_NAMES}
+# material eval() counts for each square content
+PIECE_VALUE = {'r': man_value, 'R': king_value, 'b': -man_value,
+               'B': -king_value, '.': 0}
+# Incremental evaluation keeps its running score in whole thousandths, the
+# terms of the weights rounded to them, so the sum comes out the same in
+# any order: a running score and a full rescore, on any backend, agree
+# exactly.
+EVAL_UNITS = 1000
+# The terms of the weights in EVAL_UNITS by piece: its material, its
+# unsafe and backed terms, and by y * 8 + x the term it gets for where it
+# stands. Filled in by set_eval_weights.
+MATERIAL_UNITS = {}
+UNSAFE_UNITS = {}
+BACKED_UNITS = {}
+SQUARE_UNITS = {}
+# search result bound types stored in the transposition table
+EXACT, LOWER, UPPER = 0, 1, 2
+transposition_table = None
+# --cache: a PositionCache of search results kept on disk between runs
+position_cache = None
+
+# Endgame tablebase file, written by tablebase.py: a header, then one record
+# per won or lost position sorted by key. The key packs the side to move and
+# the four piece masks big-endian (see tablebase_key) so records compare
+# as bytes. Positions within the piece limit that have no record are draws.
+TB_MAGIC = b'CKTB'
+TB_HEADER = struct.Struct('<4sBBxxQ')  # magic, version, max pieces, count
+TB_VERSION = 2  # 2: keys are canonical under the colour flip
+TB_KEY_BYTES = 17
+TB_RECORD = struct.Struct('>17sBH')  # key, result, distance in plies
+TB_DRAW, TB_WIN, TB_LOSS = 0, 1, 2  # result for the side to move
+# value of a won position, less one per ply to the end of the game, far
+# above anything eval() returns
+TB_WIN_SCORE = 10000
+tablebase = None
+
+# search settings, filled in from the command line
+max_depth = 1  # deepest iteration of iterative deepening
+time_per_move = None  # wall-clock budget in seconds, None for no limit
+# deepest iteration when only a time budget is given
+MAX_SEARCH_DEPTH = 64
+move_ordering = False  # order moves before searching them, see order_moves
+# principal variation search: null windows after the first move, and
+# aspiration windows at the root, starting this wide around the value of
+# the previous iteration and widening ASPIRATION_GROWTH times per failure
+pvs = True
+ASPIRATION_WINDOW = 5
+ASPIRATION_GROWTH = 4
+incremental_eval = False  # keep eval() scores up to date move by move
+debug_eval = False  # check every incremental score against a full rescore
+# move ordering tables: two killer moves per ply and a history score per
+# (from, to) square pair, both filled by moves that caused a cutoff
+MAX_PLY = 128
+killer_moves = [[None, None] for _ in range(MAX_PLY)]
+history_scores = {}
+# search progress, reset for every move
+nodes_searched = 0
+search_deadline = None
+root_move_hint = None  # best root move of the last completed iteration
+# pv_table[ply] is the best line found from the node being searched at ply,
+# principal_variation the root line of the last completed iteration
+pv_table = [()] * (MAX_PLY + 1)
+principal_variation = ()
+# the rest of the principal variation of the last move searched, keyed by
+# the position each step expects to reach: {key: (plies ahead, line)}.
+# plies ahead counts from the position last searched.
+expected_lines = {}
+search_core = "copy"  # "copy" searches successor states, "inplace" a Position
+# quiescence: how many plies past the nominal depth a line may go on while
+# the side to move has a jump to make, 0 to stop at the nominal depth
+quiescence_depth = 0
+# --solver pns: prove a forced win with proof-number search instead of
+# playing move by move, trying win lengths up to pns_max_plies and giving
+# up once a proof tree holds pns_max_nodes nodes
+solver = "alphabeta"
+pns_max_plies = 41
+pns_max_nodes = 1000000
+# --solver mcts: playouts per move (None to rely on time_per_move alone),
+# how many leaves are played out together, and the UCT exploration constant
+mcts_playouts = 1000
+mcts_batch = 8
+mcts_exploration = 1.4
+# a playout still undecided after this many plies is scored by material
+MCTS_PLAYOUT_PLIES = 100
+playouts_run = 0  # playouts of the game so far, for the throughput report
+puzzle_deadline = None  # batch mode: wall-clock limit of the whole puzzle
+batch_args = None  # batch mode: the command line, set in each worker
+# --threads: worker processes the root moves are split across, None to search
+# on one core, and the shallowest iteration worth splitting
+search_pool = None
+PARALLEL_MIN_DEPTH = 4
+# search_move calls so far; a --threads worker ages its transposition table
+# when a task comes from a new one
+searches_started = 0
+worker_search = None
+# --stats-json: a SearchStats the search reports to, None when not wanted
+search_stats = None
+batch_eval_leaves = False  # score the leaf children of a node in one batch
+# draw rules. A position reached for the REPETITION_LIMIT-th time, or
+# move_limit plies in a row without a capture (0 for no limit), ends the
+# game drawn. With search_repetitions, repetition_keys holds the keys of
+# the positions of the game so far and of the path being searched, and the
+# search scores reaching one of them again as a draw.
+REPETITION_LIMIT = 3
+game_repetitions = True
+search_repetitions = False
+move_limit = 80
+repetition_keys = set()
+
+
+class SearchTimeout(Exception):
+    # Raised inside the search when the time budget of the move runs out.
+    pass
+
+
+class PuzzleTimeout(Exception):
+    # Raised when a batch puzzle runs past its time limit; unlike
+    # SearchTimeout it is not caught by search_move and ends the game.
+    pass
+
+
+class Move:
+    # A move of the current player, kept apart from the board it leads to
+    # so the search only builds that board when it descends into the move.
+    __slots__ = ('path', 'captured', 'promotion')
+
+    def __init__(self, path, captured, promotion):
+        """
+            :param path: squares the piece visits, origin first
+            :type path: Tuple[Tuple(int, int)]
+            :param captured: squares of the pieces it jumps
+            :type captured: Tuple[Tuple(int, int)]
+            :param promotion: if the piece is crowned at the end of the move
+            :type promotion: Boolean
+        """
+        self.path = path
+        self.captured = captured
+        self.promotion = promotion
+
+    def __repr__(self):
+        return "Move(%r, %r, %r)" % (self.path, self.captured,
+                                     self.promotion)
 
 
 class State:
     # This class is used to represent a state.
     # board : a list of lists that represents the 8*8 board
-    def __init__(self, board, cur_turn, parent=None):
+    def __init__(self, board, cur_turn, parent=None, key=None, move=None):
         """
             store state's board information and who is making next turn
             :param board: board information
             :type board: List[List]
             :param cur_turn: the current player
             :type cur_turn: List[str]
+            :param key: Zobrist hash of the position, computed from the
+            board when not given
+            :type key: int
+            :param move: squares the piece visited to reach this state from
+            parent, origin first
+            :type move: Tuple[Tuple(int, int)]
         """
         self.board = board
         self.width = 8
         self.height = 8
         self.cur_turn = cur_turn
         self.parent = parent
+        if key is None:
+            key = zobrist_key(board, cur_turn)
+        self.key = key
+        self.move = move
+        # running eval() score in EVAL_UNITS, kept when incremental
+        # evaluation is on. It is worked out from score_parent's the first
+        # time eval() is called.
+        self.score = None
+        self.score_parent = None
 
     def generate_successor(self):
         """
@@ -61,17 +330,30 @@ class State:
             :return: The list of successor states.
             :rtype: List[State]
         """
-        states = []
+        return [self.play(move) for move in self.iter_moves()]
+
+    def iter_moves(self):
+        """
+            Yield the legal moves of the current player one at a time
+            without building any board. Jumping is mandatory for the whole
+            side, so if any piece can jump only jump sequences are yielded,
+            piece by piece; otherwise the slides of each piece.
+            :rtype: Iterator[Move]
+        """
         pieces = self.get_pieces()
-        # check if piece should move upwards or downwards
-        for piece in pieces:
-            jump_list = self.jump_recurse(piece)
-            if jump_list:
-                states.extend(jump_list)
-            else:
-                slide_list = self.slide(piece)
-                states.extend(slide_list)
-        return states
+        if self.has_jump(pieces):
+            for piece in pieces:
+                yield from self.jump_recurse(piece)
+        else:
+            for piece in pieces:
+                yield from self.slide(piece)
+
+    def must_jump(self):
+        """
+            Returns if the current player has a jump, and so must take one
+            :rtype: Boolean
+        """
+        return self.has_jump(self.get_pieces())
 
     def get_pieces(self):
         """
@@ -87,180 +369,328 @@ class State:
                     pieces.append((column, row))
         return pieces
 
+    def has_jump(self, pieces):
+        """
+            Returns if any of pieces can make a jump
+            :rtype: Boolean
+        """
+        board = self.board
+        opponent = get_opp_char(self.cur_turn)
+        for x, y in pieces:
+            for (x_mid, y_mid), (x_next, y_next) in \
+                    JUMPS[board[y][x]][y * 8 + x]:
+                if board[y_mid][x_mid] in opponent and \
+                        board[y_next][x_next] == '.':
+                    return True
+        return False
+
     def slide(self, piece):
         """
-            Returns a list of states after a piece makes a jump in any possible
-            direction based on current payer
+            Yield the moves of a piece sliding in any possible direction
+            based on current player
             :param piece: The x-coordinate and y-coordinate
             of the piece's current position.
             :type piece: Tuple(int, int)
-            :return: a list of State objects representing the board after the jump.
-            :rtype: List[State]
+            :rtype: Iterator[Move]
         """
-        states = []
-        x = piece[0]
-        y = piece[1]
-        if self.cur_turn == player:
-            if self.board[y][x] == 'r':
-                movement = [(1, -1), (-1, -1)]
-            else:
-                movement = [(1, -1), (-1, -1), (1, 1), (-1, 1)]
-        else:
-            if self.board[y][x] == 'b':
-                movement = [(1, 1), (-1, 1)]
-            else:
-                movement = [(1, -1), (-1, -1), (1, 1), (-1, 1)]
-        for x_dir, y_dir in movement:
-            new_board = deepcopy(self.board)
-            x_update = x + x_dir
-            y_update = y + y_dir
-            if x_update >= self.width or x_update < 0 or y_update < 0 or \
-                    y_update >= self.height:
-                continue
-            if new_board[y_update][x_update] == '.':
-                new_board[y_update][x_update] = new_board[y][x]
-                new_board[y][x] = '.'
-                states.append(
-                    State(queen_checker(new_board), get_opp_char(self.cur_turn), self))
-        return states
+        x, y = piece
+        board = self.board
+        piece_char = board[y][x]
+        for target in SLIDES[piece_char][y * 8 + x]:
+            if board[target[1]][target[0]] == '.':
+                yield Move((piece, target), (),
+                           self.crowns(piece_char, target[1]))
+
+    def crowns(self, piece, y):
+        """
+            Returns if a piece landing on row y becomes a king
+            :rtype: Boolean
+        """
+        return (piece == 'r' and y == 0) or \
+            (piece == 'b' and y == self.height - 1)
 
-    def jump_helper(self, piece):
+    def jump_helper(self, piece, origin, captured, opponent):
         """
-            Returns a list of states after a piece makes a jump in any possible
-            direction based on current payer
+            Returns the single jumps available to the piece that started
+            its move on origin and now stands on piece, having captured the
+            pieces on captured so far. The board is read as it is part way
+            through the move: origin is empty and the captured pieces are
+            gone.
             :param piece: The x-coordinate and y-coordinate
             of the piece's current position.
             :type piece: Tuple(int, int)
-            :return: a list of State objects representing the board after the jump.
-            :rtype: List[State]
+            :param opponent: the characters of the other player's pieces
+            :type opponent: List[str]
+            :return: (landing square, jumped square) pairs
+            :rtype: List[Tuple]
         """
         all_jumps = []
-        if self.cur_turn == player:
-            if self.board[piece[1]][piece[0]] == 'r':
-                movement = [(2, -2), (-2, -2)]
-            else:
-                movement = [(2, -2), (-2, -2), (2, 2), (-2, 2)]
-        else:
-            if self.board[piece[1]][piece[0]] == 'b':
-                movement = [(2, 2), (-2, 2)]
-            else:
-                movement = [(2, -2), (-2, -2), (2, 2), (-2, 2)]
-        for x_dir, y_dir in movement:
-            jumps = self.jump(piece[0], piece[1], x_dir, y_dir)
-            if jumps is not None:
-                all_jumps.append(jumps)
+        board = self.board
+        for over, landing in \
+                JUMPS[board[origin[1]][origin[0]]][piece[1] * 8 + piece[0]]:
+            if board[over[1]][over[0]] in opponent and \
+                    over not in captured and \
+                    (board[landing[1]][landing[0]] == '.' or
+                     landing == origin or landing in captured):
+                all_jumps.append((landing, over))
         return all_jumps
 
-    def jump(self, i, j, x_dir, y_dir):
-        """
-        Returns a state after a piece makes a jump in a given direction.
-
-        :param i: The x-coordinate of the piece's current position.
-        :type i: int
-        :param j: The y-coordinate of the piece's current position.
-        :type j: int
-        :param x_dir: The x-direction of the jump.
-        :type x_dir: int
-        :param y_dir: The y-direction of the jump.
-        :type y_dir: int
-        :return: board objects representing the board after the jump.
-        :rtype: State
-        """
-        x_mid, y_mid = i + x_dir // 2, j + y_dir // 2
-        x_next, y_next = i + x_dir, j + y_dir
-        if x_next < 0 or x_next >= self.width or y_next < 0 or y_next >= self.height:
-            return None
-        if self.board[y_mid][x_mid] in get_opp_char(self.cur_turn) and \
-                self.board[y_next][x_next] == '.':
-            new_board = deepcopy(self.board)
-            new_board[y_next][x_next] = new_board[j][i]
-            new_board[j][i] = '.'
-            new_board[y_mid][x_mid] = '.'
-            new_state = State(new_board, self.cur_turn, self)
-            cache[str(new_state.board)] = (x_next, y_next)
-            return new_state
-        else:
-            return None
-
     def jump_recurse(self, piece):
         """
-            Returns list of states after piece makes jump.
+            Returns the moves of every complete jump sequence of a piece.
+            Each pending sequence carries its own landing square, so the
+            expansion needs no intermediate boards.
             :param piece: The x-coordinate and y-coordinate of the
             piece's current position.
             :type piece: tuple(int, int)
-            :return: state objects representing the board after the jump.
-            :rtype: List[State]
+            :rtype: List[Move]
         """
-        list_state = []
-        all_jumps = self.jump_helper(piece)
+        moves = []
+        opponent = get_opp_char(self.cur_turn)
+        all_jumps = deque(((piece, landing), (over,)) for landing, over in
+                          self.jump_helper(piece, piece, (), opponent))
         while all_jumps:
-            next_state = all_jumps.pop(0)
-            arr = next_state.jump_helper(cache[str(next_state.board)])
+            path, captured = all_jumps.popleft()
+            arr = self.jump_helper(path[-1], piece, captured, opponent)
             if arr:
-                for single_state in arr:
-                    all_jumps.append(single_state)
+                for landing, over in arr:
+                    all_jumps.append((path + (landing,), captured + (over,)))
             else:
-                list_state.append(
-                    State(queen_checker(next_state.board),
-                          get_opp_char(self.cur_turn), next_state.parent))
-        return list_state
+                moves.append(Move(
+                    path, captured,
+                    self.crowns(self.board[piece[1]][piece[0]], path[-1][1])))
+        return moves
+
+    def play(self, move):
+        """
+            Returns the state after the current player makes move
+            :type move: Move
+            :rtype: State
+        """
+        new_board = [row[:] for row in self.board]
+        x, y = move.path[0]
+        x_to, y_to = move.path[-1]
+        piece = new_board[y][x]
+        piece_keys = ZOBRIST[piece]
+        key = self.key ^ piece_keys[y * 8 + x] ^ \
+            piece_keys[y_to * 8 + x_to] ^ ZOBRIST_BLACK_TO_MOVE
+        new_board[y][x] = '.'
+        new_board[y_to][x_to] = piece
+        for x_over, y_over in move.captured:
+            key ^= ZOBRIST[new_board[y_over][x_over]][y_over * 8 + x_over]
+            new_board[y_over][x_over] = '.'
+        key ^= crown_key(new_board)
+        new_state = State(queen_checker(new_board),
+                          get_opp_char(self.cur_turn), self, key, move.path)
+        if self.score is not None or self.score_parent is not None:
+            new_state.score_parent = self
+        return new_state
+
+    def unplay(self, move):
+        """
+            Take back play(move). A State is never changed by play, so there
+            is nothing to do.
+        """
 
     def eval(self):
         """
-            Returns a int that represents board's value
+            Returns a int that represents board's value. States created with
+            incremental evaluation on return the score kept up to date move
+            by move, the rest score the whole board.
+            :rtype: int
+        """
+        if self.score is None and self.score_parent is None:
+            return self.full_eval()
+        return self.eval_units() / EVAL_UNITS
+
+    def eval_units(self):
+        """
+            Returns the running score in whole EVAL_UNITS, or full_units()
+            when none is kept
+            :rtype: int
+        """
+        if self.score is None:
+            if self.score_parent is None:
+                return self.full_units()
+            self.score = self.score_parent.score_after(self)
+            self.score_parent = None
+        if debug_eval:
+            check_incremental_score(self)
+        return self.score
+
+    def full_eval(self):
+        """
+            Returns a int that represents board's value, scoring every
+            square
             :rtype: int
         """
         score = 0
         # check checker's weight by comparing their number
         for row in self.board:
-            score += 1 * (row.count('r') - row.count('b')) + 2.5 * (
-                    row.count('R') - row.count('B'))
+            score += man_value * (row.count('r') - row.count('b')) + \
+                king_value * (row.count('R') - row.count('B'))
+        for row in range(self.height):
+            for column in range(self.width):
+                score = self.add_square_score(score, row, column)
+        return score
+
+    def add_square_score(self, score, row, column):
+        """
+            Returns score plus the positional terms of the piece on
+            (column, row). They only depend on that square and its four
+            diagonal neighbours.
+            :rtype: int
+        """
+        if self.board[row][column] in ['r', 'R']:
+            # check the weight by comparing their position for row and
+            # column
+            if self.board[row][column] == 'r':
+                # check r's security
+                if not is_safe_r(self.board, row, column):
+                    score += red_man_unsafe
+                elif is_enhance_r(self.board, row, column):
+                    score += red_man_backed
+                if row != 0:
+                    score += (self.height - row) * red_man_advance + \
+                             (red_man_center - abs(column - 3) * red_man_edge)
+                # if checker has chance to become king, then become it.
+                else:
+                    score += red_man_crowning
+            else:
+                # check R's security
+                if not is_safe_r(self.board, row, column):
+                    score += red_king_unsafe
+                score += (red_king_center - abs(column - 3) * red_king_edge) \
+                    + (self.height - row) * red_king_advance
+                # R's position, a little bit hard coding
+                score += score_board1[row][column] * red_king_square
+        if self.board[row][column] in ['b', 'B']:
+            if self.board[row][column] == 'b':
+                # check b's security
+                if not is_safe_b(self.board, row, column):
+                    score += black_man_unsafe
+                elif is_enhance_b(self.board, row, column):
+                    score += black_man_backed
+                if row != 7:
+                    score += (self.height - row) * black_man_advance + \
+                        (black_man_center - abs(column - 3) * black_man_edge)
+                # if checker has chance to become king, then become it.
+                else:
+                    # check B's security
+                    score += black_man_crowning
+            else:
+                if not is_safe_b(self.board, row, column):
+                    score += black_king_unsafe
+                score += (black_king_center -
+                          abs(column - 3) * black_king_edge) + \
+                    (self.height - row) * black_king_advance
+        return score
+
+    def full_units(self):
+        """
+            Returns full_eval() with each term rounded to whole EVAL_UNITS,
+            the score incremental evaluation keeps up to date
+            :rtype: int
+        """
+        score = 0
         for row in range(self.height):
             for column in range(self.width):
-                if self.board[row][column] in ['r', 'R']:
-                    # check the weight by comparing their position for row and
-                    # column
-                    if self.board[row][column] == 'r':
-                        # check r's security
-                        if not is_safe_r(self.board, row, column):
-                            score -= 2
-                        elif is_enhance_r(self.board, row, column):
-                            score += 8
-                        if row != 0:
-                            score += (self.height - row) * 0.5 + \
-                                     (7 - abs(column - 3) * 1)
-                        # if checker has chance to become king, then become it.
-                        else:
-                            score += 2.5
-                    else:
-                        # check R's security
-                        if not is_safe_r(self.board, row, column):
-                            score -= 5
-                        score += 1.5 * (7 - abs(column - 3) * 0.5) + \
-                                 (self.height - row) * 0.5
-                        # R's position, a little bit hard coding
-                        score += score_board1[row][column]
-                if self.board[row][column] in ['b', 'B']:
-                    if self.board[row][column] == 'b':
-                        # check b's security
-                        if not is_safe_b(self.board, row, column):
-                            score += 2
-                        elif is_enhance_b(self.board, row, column):
-                            score -= 5.5
-                        if row != 7:
-                            score -= (self.height - row) * 0.5 + \
-                                     (7 - abs(column - 3) * 0.5)
-                        # if checker has chance to become king, then become it.
-                        else:
-                            # check B's security
-                            score += 2.5
-                    else:
-                        if not is_safe_b(self.board, row, column):
-                            score -= 5
-                        score -= 1.5 * (7 - abs(column - 3) * 0.5) + \
-                                 (self.height - row) * 0.5
+                score = self.add_square_units(score, row, column)
+        return score
+
+    def add_square_units(self, score, row, column):
+        """
+            Returns score plus the material and the add_square_score terms
+            of the piece on (column, row), each rounded to whole EVAL_UNITS
+            :rtype: int
+        """
+        piece = self.board[row][column]
+        if piece == '.':
+            return score
+        # check the piece's security, then whether a man is backed up
+        if piece in ['r', 'R']:
+            if not is_safe_r(self.board, row, column):
+                score += UNSAFE_UNITS[piece]
+            elif piece == 'r' and is_enhance_r(self.board, row, column):
+                score += BACKED_UNITS[piece]
+        else:
+            if not is_safe_b(self.board, row, column):
+                score += UNSAFE_UNITS[piece]
+            elif piece == 'b' and is_enhance_b(self.board, row, column):
+                score += BACKED_UNITS[piece]
+        return score + MATERIAL_UNITS[piece] + \
+            SQUARE_UNITS[piece][row * 8 + column]
+
+    def score_after(self, child):
+        """
+            Returns the eval() score of child, a successor of self, by
+            rescoring only the squares the move changed and their diagonal
+            neighbours, in EVAL_UNITS
+            :rtype: int
+        """
+        score = self.eval_units()
+        for x, y in self.affected_by(child.move):
+            score -= self.add_square_units(0, y, x)
+            score += child.add_square_units(0, y, x)
+        return score
+
+    def affected_by(self, path):
+        """
+            Returns the squares whose eval() terms may change when the piece
+            walks path: the squares it changes and their diagonal neighbours
+            :rtype: Set[Tuple(int, int)]
+        """
+        changed = set(path)
+        for (x, y), (x_next, y_next) in zip(path, path[1:]):
+            if abs(x_next - x) == 2:
+                changed.add(((x + x_next) // 2, (y + y_next) // 2))
+        # queen_checker also crowns men an input left on the far rows
+        if 'r' in self.board[0] or 'b' in self.board[7]:
+            for column in range(self.width):
+                if self.board[0][column] == 'r':
+                    changed.add((column, 0))
+                if self.board[7][column] == 'b':
+                    changed.add((column, 7))
+        affected = set(changed)
+        for x, y in changed:
+            affected.update(DIAGONALS[y * 8 + x])
+        return affected
+
+    def local_score(self, squares):
+        """
+            Returns the terms of eval() that come from the pieces on
+            squares, in EVAL_UNITS
+            :rtype: int
+        """
+        score = 0
+        for x, y in squares:
+            score = self.add_square_units(score, y, x)
         return score
 
+    def piece_at(self, x, y):
+        """
+            Returns the character on square (x, y)
+            :rtype: str
+        """
+        return self.board[y][x]
+
+    def is_eliminated(self):
+        """
+            Returns if either side has no pieces left on the board
+            :rtype: Boolean
+        """
+        player_eliminate = True
+        rival_eliminate = True
+        for row in self.board:
+            if player_eliminate == False and rival_eliminate == False:
+                break
+            for column in row:
+                if column in player:
+                    player_eliminate = False
+                if column in computer:
+                    rival_eliminate = False
+        return player_eliminate or rival_eliminate
+
     def display(self):
         for i in self.board:
             for j in i:
@@ -269,6 +699,132 @@ class State:
         print("")
 
 
+class Undo:
+    # What Position.make_move needs to remember to take a move back.
+    __slots__ = ('captured_pieces', 'crowned', 'key', 'score')
+
+    def __init__(self, captured_pieces, crowned, key, score):
+        """
+            :param captured_pieces: the characters the move captured, in
+            the order of Move.captured
+            :type captured_pieces: List[str]
+            :param crowned: squares of the men the move crowned
+            :type crowned: List[Tuple(int, int)]
+            :param key: Zobrist hash before the move
+            :type key: int
+            :param score: running score before the move, if kept
+            :type score: int
+        """
+        self.captured_pieces = captured_pieces
+        self.crowned = crowned
+        self.key = key
+        self.score = score
+
+
+class Position(State):
+    # A single board the in-place search core plays moves on with
+    # make_move and takes them back with unmake_move, so searching a node
+    # allocates no State. It reuses State's move generator and evaluator.
+    def __init__(self, board, cur_turn, key=None):
+        """
+            :param board: board information, copied so the caller's board
+            is left alone
+            :type board: List[List]
+            :param cur_turn: the current player
+            :type cur_turn: List[str]
+        """
+        State.__init__(self, [row[:] for row in board], cur_turn, None, key)
+        self.undo_stack = []
+
+    @classmethod
+    def from_state(cls, s):
+        """
+            Returns a Position holding the position of s
+            :type s: State or BitState
+            :rtype: Position
+        """
+        position = cls(s.board, s.cur_turn, s.key)
+        if s.score is not None or s.score_parent is not None:
+            position.score = s.eval_units()
+        return position
+
+    def play(self, move):
+        """
+            Make move on this board, see make_move
+            :rtype: Position
+        """
+        self.make_move(move)
+        return self
+
+    def unplay(self, move):
+        """
+            Take back the last move, see unmake_move
+        """
+        self.unmake_move(move)
+
+    def make_move(self, move):
+        """
+            Play move for the current player on this board and hand the turn
+            over. Crowning follows queen_checker.
+            :type move: Move
+        """
+        board = self.board
+        x, y = move.path[0]
+        x_to, y_to = move.path[-1]
+        affected = None
+        score = self.score
+        if score is not None:
+            affected = self.affected_by(move.path)
+            self.score -= self.local_score(affected)
+        piece = board[y][x]
+        piece_keys = ZOBRIST[piece]
+        key = self.key ^ piece_keys[y * 8 + x] ^ \
+            piece_keys[y_to * 8 + x_to] ^ ZOBRIST_BLACK_TO_MOVE
+        captured_pieces = []
+        for x_over, y_over in move.captured:
+            captured = board[y_over][x_over]
+            captured_pieces.append(captured)
+            key ^= ZOBRIST[captured][y_over * 8 + x_over]
+            board[y_over][x_over] = '.'
+        board[y][x] = '.'
+        board[y_to][x_to] = piece
+        crowned = []
+        if 'r' in board[0] or 'b' in board[7]:
+            key ^= crown_key(board)
+            for row, man in ((0, 'r'), (7, 'b')):
+                for column in range(self.width):
+                    if board[row][column] == man:
+                        board[row][column] = man.upper()
+                        crowned.append((column, row))
+        self.undo_stack.append(Undo(captured_pieces, crowned, self.key,
+                                    score))
+        self.key = key
+        self.cur_turn = get_opp_char(self.cur_turn)
+        if affected is not None:
+            self.score += self.local_score(affected)
+
+    def unmake_move(self, move):
+        """
+            Take back move, the last one make_move played
+            :type move: Move
+        """
+        undo = self.undo_stack.pop()
+        board = self.board
+        for column, row in undo.crowned:
+            board[row][column] = board[row][column].lower()
+        x, y = move.path[0]
+        x_to, y_to = move.path[-1]
+        piece = board[y_to][x_to]
+        board[y_to][x_to] = '.'
+        board[y][x] = piece
+        for (x_over, y_over), captured in zip(move.captured,
+                                              undo.captured_pieces):
+            board[y_over][x_over] = captured
+        self.key = undo.key
+        self.score = undo.score
+        self.cur_turn = get_opp_char(self.cur_turn)
+
+
 def is_safe_r(board, row, col):
     """
         Returns if red state is secure
@@ -363,133 +919,3170 @@ def is_safe_b(board, row, col):
            or threaten_upper_left or threaten_upper_right
 
 
-def cutoff_test(s, depth):
-    """
-        Returns list of states after piece makes jump.
-        :param depth: The depth of state
-        :type depth: int
-        :param s: The State of board.
-        :type s: State
-        :return: a boolean that indicates if state is terminal state
-        :rtype: Boolean
-    """
-    if depth == 0:
-        return True
-    player_eliminate = True
-    rival_eliminate = True
-    for row in s.board:
-        if player_eliminate == False and rival_eliminate == False:
-            break
-        for column in row:
-            if column in player:
-                player_eliminate = False
-            if column in computer:
-                rival_eliminate = False
-    return player_eliminate or rival_eliminate
-
-
-def get_solution(final_state):
-    """
-            :param final_state: final state
-            :type final_state: State
-            :rtype: List[State]
-    """
-    # tracing through from goal state to initial state
-    walk_through = []
-    while final_state is not None:
-        walk_through.append(final_state)
-        final_state = final_state.parent
-    return walk_through[::-1]
+class BitState:
+    # Bitboard counterpart of State. The position is four 32-bit masks over
+    # the playable squares (see SQUARE_XY); the list of lists board is only
+    # built on demand for file I/O.
+    def __init__(self, red_men, red_kings, black_men, black_kings, cur_turn,
+                 parent=None, key=None, move=None):
+        """
+            store state's piece masks and who is making next turn
+            :param red_men: mask of squares holding 'r'
+            :type red_men: int
+            :param red_kings: mask of squares holding 'R'
+            :type red_kings: int
+            :param black_men: mask of squares holding 'b'
+            :type black_men: int
+            :param black_kings: mask of squares holding 'B'
+            :type black_kings: int
+            :param cur_turn: the current player
+            :type cur_turn: List[str]
+            :param key: Zobrist hash of the position, computed from the
+            masks when not given
+            :type key: int
+            :param move: squares the piece visited to reach this state from
+            parent, origin first
+            :type move: Tuple[Tuple(int, int)]
+        """
+        self.red_men = red_men
+        self.red_kings = red_kings
+        self.black_men = black_men
+        self.black_kings = black_kings
+        self.width = 8
+        self.height = 8
+        self.cur_turn = cur_turn
+        self.parent = parent
+        if key is None:
+            key = bit_zobrist_key((red_men, red_kings, black_men,
+                                   black_kings), cur_turn)
+        self.key = key
+        self.move = move
+        # running eval() score in EVAL_UNITS, kept when incremental
+        # evaluation is on. It is worked out from score_parent's the first
+        # time eval() is called.
+        self.score = None
+        self.score_parent = None
+        self._board = None
 
+    @classmethod
+    def from_board(cls, board, cur_turn):
+        """
+            Build a BitState from a list of lists board.
+            :raises ValueError: if a piece sits on a square that is not
+            playable, the masks cannot represent it.
+            :rtype: BitState
+        """
+        return cls(*(board_masks(board) + (cur_turn,)))
 
-def max_value(s, alpha, beta, depth):
-    chosen_move = None
-    if cutoff_test(s, depth):
-        return chosen_move, s.eval()
-    v = float('-inf')
-    all_successor = s.generate_successor()
-    for successor in all_successor:
-        no_use_object, successor_v = min_value(successor, alpha, beta, depth - 1)
-        if v < successor_v:
-            v = successor_v
-            chosen_move = successor
-        if v >= beta:
-            return chosen_move, v
-        alpha = max(alpha, v)
-    return chosen_move, v
+    @property
+    def board(self):
+        """
+            The list of lists form of the position, built on first use.
+            :rtype: List[List[str]]
+        """
+        if self._board is None:
+            board = [['.'] * self.width for _ in range(self.height)]
+            for mask, piece in ((self.red_men, 'r'), (self.red_kings, 'R'),
+                                (self.black_men, 'b'),
+                                (self.black_kings, 'B')):
+                while mask:
+                    bit = mask & -mask
+                    x, y = SQUARE_XY[bit.bit_length() - 1]
+                    board[y][x] = piece
+                    mask ^= bit
+            self._board = board
+        return self._board
 
+    def generate_successor(self):
+        """
+            Generate a list of states that extends from current state based
+            on current player, in the same order as State.generate_successor
+            :rtype: List[BitState]
+        """
+        return [self.play(move) for move in self.iter_moves()]
 
-def min_value(s, alpha, beta, depth):
-    chosen_move = None
-    if cutoff_test(s, depth):
-        return chosen_move, s.eval()
-    v = float('inf')
-    all_successor = s.generate_successor()
-    for successor in all_successor:
-        no_use_object, successor_v = max_value(successor, alpha, beta, depth - 1)
-        if v > successor_v:
-            v = successor_v
-            chosen_move = successor
-        if v <= alpha:
-            return chosen_move, v
-        beta = min(beta, v)
-    return chosen_move, v
+    def iter_moves(self):
+        """
+            Yield the legal moves of the current player one at a time, in
+            the same order as State.iter_moves
+            :rtype: Iterator[Move]
+        """
+        if self.cur_turn == player:
+            pieces = self.red_men | self.red_kings
+        else:
+            pieces = self.black_men | self.black_kings
+        if self.has_jump(pieces):
+            generate = self.jump_recurse
+        else:
+            generate = self.slide
+        while pieces:
+            bit = pieces & -pieces
+            pieces ^= bit
+            yield from generate(bit.bit_length() - 1)
 
+    def must_jump(self):
+        """
+            Returns if the current player has a jump, and so must take one
+            :rtype: Boolean
+        """
+        if self.cur_turn == player:
+            return self.has_jump(self.red_men | self.red_kings)
+        return self.has_jump(self.black_men | self.black_kings)
 
-def alpha_beta_search(s):
-    cur_state = s
-    walkthrough.append(cur_state)
-    next_state, v = max_value(s, float("-inf"), float("inf"), 1)
-    flip = 0
-    walkthrough.append(next_state)
-    while next_state is not None:
-        if flip == 0:
-            cur_state = next_state
-            next_state, v = min_value(next_state, float("-inf"), float("inf"), 1)
-            flip = 1
+    def has_jump(self, pieces):
+        """
+            Returns if any piece on the pieces mask can make a jump
+            :rtype: Boolean
+        """
+        if self.cur_turn == player:
+            opponent = self.black_men | self.black_kings
+            men = self.red_men
         else:
-            cur_state = next_state
-            next_state, v = max_value(next_state, float("-inf"), float("inf"), 1)
-            flip = 0
-        if next_state is not None:
-            walkthrough.append(next_state)
-    return cur_state, v
-
+            opponent = self.red_men | self.red_kings
+            men = self.black_men
+        empty = ~(self.red_men | self.red_kings | self.black_men |
+                  self.black_kings)
+        while pieces:
+            bit = pieces & -pieces
+            pieces ^= bit
+            sq = bit.bit_length() - 1
+            dirs = KING_DIRS
+            if men & bit:
+                dirs = RED_MAN_DIRS if self.cur_turn == player \
+                    else BLACK_MAN_DIRS
+            for d in dirs:
+                target = JUMP_TO[sq][d]
+                if target >= 0 and opponent >> JUMP_OVER[sq][d] & 1 and \
+                        empty >> target & 1:
+                    return True
+        return False
 
-def get_opp_char(cur):
-    if cur == ['b', 'B']:
-        return ['r', 'R']
-    else:
-        return ['b', 'B']
+    def _piece_kind(self, sq):
+        """
+            Returns which of the masks (0 r, 1 R, 2 b, 3 B) holds sq
+            :rtype: int
+        """
+        return _piece_index((self.red_men, self.red_kings, self.black_men,
+                             self.black_kings), 1 << sq)
 
+    def slide(self, sq):
+        """
+            Yield the moves of the piece on sq sliding in any possible
+            direction
+            :rtype: Iterator[Move]
+        """
+        empty = ~(self.red_men | self.red_kings | self.black_men |
+                  self.black_kings)
+        kind = self._piece_kind(sq)
+        for d in _piece_dirs(kind):
+            target = STEP[sq][d]
+            if target < 0 or not empty >> target & 1:
+                continue
+            yield Move((SQUARE_XY[sq], SQUARE_XY[target]), (),
+                       _crowns(kind, target))
 
-def get_next_turn(curr_turn):
-    if curr_turn == 'r':
-        return 'b'
-    else:
-        return 'r'
+    def jump_helper(self, sq, kind, empty, opponent):
+        """
+            Returns the single jumps available to a piece of the given kind
+            on sq, with the squares in empty free to land on and the pieces
+            in opponent free to jump
+            :return: (landing square, jumped square) pairs
+            :rtype: List[Tuple[int, int]]
+        """
+        all_jumps = []
+        for d in _piece_dirs(kind):
+            target = JUMP_TO[sq][d]
+            if target < 0:
+                continue
+            over = JUMP_OVER[sq][d]
+            if opponent >> over & 1 and empty >> target & 1:
+                all_jumps.append((target, over))
+        return all_jumps
 
+    def jump_recurse(self, sq):
+        """
+            Returns the moves of every complete jump sequence of the piece
+            on sq
+            :rtype: List[Move]
+        """
+        moves = []
+        kind = self._piece_kind(sq)
+        if kind < 2:
+            opponent = self.black_men | self.black_kings
+        else:
+            opponent = self.red_men | self.red_kings
+        # the piece has left its square; captured pieces become empty
+        # squares it cannot jump again
+        empty = ~(self.red_men | self.red_kings | self.black_men |
+                  self.black_kings) | (1 << sq)
+        all_jumps = deque(((sq, landing), 1 << over) for landing, over in
+                          self.jump_helper(sq, kind, empty, opponent))
+        while all_jumps:
+            path, captured = all_jumps.popleft()
+            arr = self.jump_helper(path[-1], kind, empty | captured,
+                                   opponent & ~captured)
+            if arr:
+                all_jumps.extend((path + (landing,), captured | 1 << over)
+                                 for landing, over in arr)
+            else:
+                moves.append(Move(
+                    tuple(SQUARE_XY[step] for step in path),
+                    tuple(SQUARE_XY[step] for step in
+                          _jumped_squares(path)),
+                    _crowns(kind, path[-1])))
+        return moves
 
-def queen_checker(board):
-    for z in range(len(board[0])):
-        if board[0][z] == 'r':
-            board[0][z] = 'R'
-    for m in range(len(board[7])):
-        if board[7][m] == 'b':
-            board[7][m] = 'B'
-    return board
+    def play(self, move):
+        """
+            Returns the state after the current player makes move. Crowning
+            follows queen_checker: every man on the far row is crowned.
+            :type move: Move
+            :rtype: BitState
+        """
+        origin = XY_SQUARE[move.path[0]]
+        target = XY_SQUARE[move.path[-1]]
+        masks = [self.red_men, self.red_kings, self.black_men,
+                 self.black_kings]
+        kind = _piece_index(masks, 1 << origin)
+        # a king can end a multi-jump on the square it started from
+        masks[kind] = masks[kind] & ~(1 << origin) | (1 << target)
+        for xy in move.captured:
+            cleared = ~(1 << XY_SQUARE[xy])
+            for i in range(4):
+                masks[i] &= cleared
+        red_men, red_kings, black_men, black_kings = masks
+        red_kings |= red_men & RED_KING_ROW
+        red_men &= ~RED_KING_ROW
+        black_kings |= black_men & BLACK_KING_ROW
+        black_men &= ~BLACK_KING_ROW
+        new_masks = (red_men, red_kings, black_men, black_kings)
+        old_masks = (self.red_men, self.red_kings, self.black_men,
+                     self.black_kings)
+        # only the few squares that changed contribute to the key update
+        key = self.key ^ ZOBRIST_BLACK_TO_MOVE
+        for kind in range(4):
+            changed = old_masks[kind] ^ new_masks[kind]
+            while changed:
+                bit = changed & -changed
+                changed ^= bit
+                key ^= BIT_ZOBRIST[kind][bit.bit_length() - 1]
+        child = BitState(red_men, red_kings, black_men, black_kings,
+                         get_opp_char(self.cur_turn), self, key, move.path)
+        if self.score is not None or self.score_parent is not None:
+            child.score_parent = self
+        return child
 
+    def unplay(self, move):
+        """
+            Take back play(move). A BitState is never changed by play, so
+            there is nothing to do.
+        """
 
-def read_from_file(filename):
+    def eval(self):
+        """
+            Returns the same value as State.eval, kept up to date move by
+            move when incremental evaluation is on
+            :rtype: float
+        """
+        if self.score is None and self.score_parent is None:
+            return self.full_eval()
+        return self.eval_units() / EVAL_UNITS
 
-    f = open(filename)
-    lines = f.readlines()
-    board = [[str(x) for x in l.rstrip()] for l in lines]
-    f.close()
+    def eval_units(self):
+        """
+            Returns the running score in whole EVAL_UNITS, see
+            State.eval_units
+            :rtype: int
+        """
+        if self.score is None:
+            if self.score_parent is None:
+                return self.full_units()
+            self.score = self.score_parent.score_after(self)
+            self.score_parent = None
+        if debug_eval:
+            check_incremental_score(self)
+        return self.score
+
+    def full_eval(self):
+        """
+            Returns the same value as State.full_eval, computed from the
+            masks. Terms are added in the same order so the floats match
+            exactly.
+            :rtype: float
+        """
+        red_men, red_kings = self.red_men, self.red_kings
+        black_men, black_kings = self.black_men, self.black_kings
+        score = man_value * (bin(red_men).count('1') -
+                             bin(black_men).count('1')) + \
+            king_value * (bin(red_kings).count('1') -
+                          bin(black_kings).count('1'))
+        pieces = red_men | red_kings | black_men | black_kings
+        while pieces:
+            bit = pieces & -pieces
+            pieces ^= bit
+            score = self.add_square_score(score, bit.bit_length() - 1)
+        return score
+
+    def add_square_score(self, score, sq):
+        """
+            Returns score plus the positional terms of the piece on sq, see
+            State.add_square_score
+            :rtype: float
+        """
+        bit = 1 << sq
+        black_kings = self.black_kings
+        red_kings = self.red_kings
+        black = self.black_men | black_kings
+        red = self.red_men | red_kings
+        occupied = red | black
+        column, row = SQUARE_XY[sq]
+        if bit & self.red_men:
+            if not _is_safe(sq, black, black_kings, occupied):
+                score += red_man_unsafe
+            elif _is_enhanced(sq, red, 2, 3):
+                score += red_man_backed
+            if row != 0:
+                score += (self.height - row) * red_man_advance + \
+                         (red_man_center - abs(column - 3) * red_man_edge)
+            else:
+                score += red_man_crowning
+        elif bit & red_kings:
+            if not _is_safe(sq, black, black_kings, occupied):
+                score += red_king_unsafe
+            score += (red_king_center - abs(column - 3) * red_king_edge) + \
+                (self.height - row) * red_king_advance
+            score += score_board1[row][column] * red_king_square
+        elif bit & self.black_men:
+            if not _is_safe(sq, red_kings, red, occupied):
+                score += black_man_unsafe
+            elif _is_enhanced(sq, black, 1, 0):
+                score += black_man_backed
+            if row != 7:
+                score += (self.height - row) * black_man_advance + \
+                    (black_man_center - abs(column - 3) * black_man_edge)
+            else:
+                score += black_man_crowning
+        elif bit & black_kings:
+            if not _is_safe(sq, red_kings, red, occupied):
+                score += black_king_unsafe
+            score += (black_king_center - abs(column - 3) * black_king_edge) \
+                + (self.height - row) * black_king_advance
+        return score
+
+    def full_units(self):
+        """
+            Returns the same value as State.full_units, computed from the
+            masks
+            :rtype: int
+        """
+        score = 0
+        pieces = self.red_men | self.red_kings | self.black_men | \
+            self.black_kings
+        while pieces:
+            bit = pieces & -pieces
+            pieces ^= bit
+            score = self.add_square_units(score, bit.bit_length() - 1)
+        return score
+
+    def add_square_units(self, score, sq):
+        """
+            Returns score plus the material and positional terms of the
+            piece on sq in whole EVAL_UNITS, see State.add_square_units
+            :rtype: int
+        """
+        bit = 1 << sq
+        black_kings = self.black_kings
+        red_kings = self.red_kings
+        black = self.black_men | black_kings
+        red = self.red_men | red_kings
+        occupied = red | black
+        column, row = SQUARE_XY[sq]
+        if bit & self.red_men:
+            piece = 'r'
+            if not _is_safe(sq, black, black_kings, occupied):
+                score += UNSAFE_UNITS['r']
+            elif _is_enhanced(sq, red, 2, 3):
+                score += BACKED_UNITS['r']
+        elif bit & red_kings:
+            piece = 'R'
+            if not _is_safe(sq, black, black_kings, occupied):
+                score += UNSAFE_UNITS['R']
+        elif bit & self.black_men:
+            piece = 'b'
+            if not _is_safe(sq, red_kings, red, occupied):
+                score += UNSAFE_UNITS['b']
+            elif _is_enhanced(sq, black, 1, 0):
+                score += BACKED_UNITS['b']
+        elif bit & black_kings:
+            piece = 'B'
+            if not _is_safe(sq, red_kings, red, occupied):
+                score += UNSAFE_UNITS['B']
+        else:
+            return score
+        return score + MATERIAL_UNITS[piece] + \
+            SQUARE_UNITS[piece][row * 8 + column]
+
+    def score_after(self, child):
+        """
+            Returns the eval() score of child, a successor of self, by
+            rescoring only the squares whose masks changed and their
+            diagonal neighbours, in EVAL_UNITS
+            :rtype: int
+        """
+        changed = (self.red_men ^ child.red_men) | \
+            (self.red_kings ^ child.red_kings) | \
+            (self.black_men ^ child.black_men) | \
+            (self.black_kings ^ child.black_kings)
+        affected = changed
+        while changed:
+            bit = changed & -changed
+            changed ^= bit
+            affected |= NEIGHBOUR_MASK[bit.bit_length() - 1]
+        before = affected & (self.red_men | self.red_kings |
+                             self.black_men | self.black_kings)
+        after = affected & (child.red_men | child.red_kings |
+                            child.black_men | child.black_kings)
+        score = self.eval_units()
+        while before:
+            bit = before & -before
+            before ^= bit
+            score -= self.add_square_units(0, bit.bit_length() - 1)
+        while after:
+            bit = after & -after
+            after ^= bit
+            score += child.add_square_units(0, bit.bit_length() - 1)
+        return score
+
+    def piece_at(self, x, y):
+        """
+            Returns the character on square (x, y)
+            :rtype: str
+        """
+        sq = XY_SQUARE.get((x, y))
+        if sq is None:
+            return '.'
+        bit = 1 << sq
+        if self.red_men & bit:
+            return 'r'
+        if self.red_kings & bit:
+            return 'R'
+        if self.black_men & bit:
+            return 'b'
+        if self.black_kings & bit:
+            return 'B'
+        return '.'
+
+    def is_eliminated(self):
+        """
+            Returns if either side has no pieces left on the board
+            :rtype: Boolean
+        """
+        return not (self.red_men | self.red_kings) or \
+            not (self.black_men | self.black_kings)
+
+    def display(self):
+        for i in self.board:
+            for j in i:
+                print(j, end="")
+            print("")
+        print("")
+
+
+def _piece_index(masks, bit):
+    """
+        Returns which of the four masks (r, R, b, B) holds bit
+        :rtype: int
+    """
+    for kind in range(4):
+        if masks[kind] & bit:
+            return kind
+    return -1
+
+
+def _piece_dirs(kind):
+    """
+        Returns the direction indexes a piece of the given mask index may use
+        :rtype: Tuple[int]
+    """
+    if kind == 0:
+        return RED_MAN_DIRS
+    if kind == 2:
+        return BLACK_MAN_DIRS
+    return KING_DIRS
+
+
+def _crowns(kind, sq):
+    """
+        Returns if a piece of the given mask index landing on sq is crowned
+        :rtype: Boolean
+    """
+    return (kind == 0 and sq < 4) or (kind == 2 and sq >= 28)
+
+
+def _jumped_squares(path):
+    """
+        Returns the squares jumped over along a path of playable squares
+        :rtype: List[int]
+    """
+    jumped = []
+    for sq, landing in zip(path, path[1:]):
+        jumped.append(STEP[sq][JUMP_TO[sq].index(landing)])
+    return jumped
+
+
+def _is_safe(sq, up_attackers, down_attackers, occupied):
+    """
+        Mask version of is_safe_r / is_safe_b. up_attackers are the pieces
+        that threaten from the row above, down_attackers the ones that
+        threaten from the row below.
+        :rtype: Boolean
+    """
+    column, row = SQUARE_XY[sq]
+    if column == 0 or column == 7 or row == 0 or row == 7:
+        return True
+    up_right, up_left, down_right, down_left = STEP[sq]
+    return not (up_attackers >> up_left & 1
+                and not occupied >> down_right & 1) \
+        or not (up_attackers >> up_right & 1
+                and not occupied >> down_left & 1) \
+        or not (down_attackers >> down_right & 1
+                and not occupied >> up_left & 1) \
+        or not (down_attackers >> down_left & 1
+                and not occupied >> up_right & 1)
+
+
+def _is_enhanced(sq, own, first_dir, second_dir):
+    """
+        Mask version of is_enhance_r / is_enhance_b: the piece is backed up
+        by own pieces on both squares in the given directions.
+        :rtype: Boolean
+    """
+    column, row = SQUARE_XY[sq]
+    if row == 0 or row == 7 or column == 0 or column == 7:
+        return False
+    return bool(own >> STEP[sq][first_dir] & 1 and
+                own >> STEP[sq][second_dir] & 1)
+
+
+def board_masks(board):
+    """
+        Returns the red men, red kings, black men and black kings masks of
+        a list of lists board
+        :raises ValueError: if a piece sits on a square that is not
+        playable, the masks cannot represent it.
+        :rtype: Tuple[int, int, int, int]
+    """
+    masks = {'r': 0, 'R': 0, 'b': 0, 'B': 0}
+    for row in range(len(board)):
+        for column in range(len(board[row])):
+            piece = board[row][column]
+            if piece == '.':
+                continue
+            sq = XY_SQUARE.get((column, row))
+            if sq is None or piece not in masks:
+                raise ValueError(
+                    "cannot place %r at (%d, %d) on a bitboard"
+                    % (piece, column, row))
+            masks[piece] |= 1 << sq
+    return masks['r'], masks['R'], masks['b'], masks['B']
+
+
+# REVERSED_BYTES[b] is the byte b with its bits in reverse order
+REVERSED_BYTES = [int('{:08b}'.format(b)[::-1], 2) for b in range(256)]
+
+
+def reverse_mask(mask):
+    """
+        Returns the 32-bit mask with its bits in reverse order: square sq
+        becomes 31 - sq, which is the square turned 180 degrees
+        :type mask: int
+        :rtype: int
+    """
+    return REVERSED_BYTES[mask & 0xFF] << 24 | \
+        REVERSED_BYTES[mask >> 8 & 0xFF] << 16 | \
+        REVERSED_BYTES[mask >> 16 & 0xFF] << 8 | \
+        REVERSED_BYTES[mask >> 24]
+
+
+def tablebase_key(masks, red_to_move):
+    """
+        Returns the tablebase key of a position: the side to move then the
+        four masks, packed big-endian. Turning the board 180 degrees and
+        swapping the colours (and the side to move) gives a position with
+        the same result for the side to move, so both share the smaller of
+        their two keys and the table stores one of them.
+        :type masks: Tuple[int, int, int, int]
+        :rtype: bytes
+    """
+    red_men, red_kings, black_men, black_kings = masks
+    key = struct.pack('>B4I', 0 if red_to_move else 1, *masks)
+    flipped = struct.pack('>B4I', 1 if red_to_move else 0,
+                          reverse_mask(black_men), reverse_mask(black_kings),
+                          reverse_mask(red_men), reverse_mask(red_kings))
+    return min(key, flipped)
+
+
+def check_incremental_score(s):
+    """
+        Assert that the running score of s matches a full rescore
+    """
+    full = s.full_units()
+    assert s.score == full, \
+        "incremental score %r != full eval %r for\n%s" % (
+            s.score, full, '\n'.join(''.join(row) for row in s.board))
+
+
+def zobrist_key(board, cur_turn):
+    """
+        Returns the Zobrist hash of a list of lists board
+        :rtype: int
+    """
+    key = 0
+    for row in range(len(board)):
+        for column in range(len(board[row])):
+            piece = board[row][column]
+            if piece != '.':
+                key ^= ZOBRIST[piece][row * 8 + column]
+    if cur_turn == computer:
+        key ^= ZOBRIST_BLACK_TO_MOVE
+    return key
+
+
+def bit_zobrist_key(masks, cur_turn):
+    """
+        Returns the Zobrist hash of the (r, R, b, B) masks
+        :rtype: int
+    """
+    key = 0
+    for kind in range(4):
+        mask = masks[kind]
+        while mask:
+            bit = mask & -mask
+            mask ^= bit
+            key ^= BIT_ZOBRIST[kind][bit.bit_length() - 1]
+    if cur_turn == computer:
+        key ^= ZOBRIST_BLACK_TO_MOVE
+    return key
+
+
+def crown_key(board):
+    """
+        Returns the Zobrist update for the men queen_checker is about to
+        crown on board
+        :rtype: int
+    """
+    key = 0
+    if 'r' in board[0]:
+        for column in range(len(board[0])):
+            if board[0][column] == 'r':
+                key ^= ZOBRIST['r'][column] ^ ZOBRIST['R'][column]
+    if 'b' in board[7]:
+        for column in range(len(board[7])):
+            if board[7][column] == 'b':
+                key ^= ZOBRIST['b'][56 + column] ^ ZOBRIST['B'][56 + column]
+    return key
+
+
+def eval_weights():
+    """
+        Returns the weights eval() uses now, keyed by EVAL_WEIGHT_NAMES
+        :rtype: Dict[str, float]
+    """
+    return {name: globals()[name] for name in EVAL_WEIGHT_NAMES}
+
+
+def make_eval_tables(weights):
+    """
+        Returns the MATERIAL_UNITS, UNSAFE_UNITS, BACKED_UNITS and
+        SQUARE_UNITS tables of the eval() weights in weights, keyed by
+        EVAL_WEIGHT_NAMES. Each term is rounded to whole EVAL_UNITS.
+        :type weights: Dict[str, float]
+        :rtype: Tuple[Dict[str, int], Dict[str, int], Dict[str, int],
+        Dict[str, List[int]]]
+    """
+    w = weights
+
+    def units(value):
+        return int(round(value * EVAL_UNITS))
+
+    material = {'r': units(w['man_value']), 'R': units(w['king_value']),
+                'b': units(-w['man_value']), 'B': units(-w['king_value']),
+                '.': 0}
+    unsafe = {'r': units(w['red_man_unsafe']),
+              'R': units(w['red_king_unsafe']),
+              'b': units(w['black_man_unsafe']),
+              'B': units(w['black_king_unsafe'])}
+    backed = {'r': units(w['red_man_backed']), 'R': 0,
+              'b': units(w['black_man_backed']), 'B': 0}
+    square = {piece: [0] * 64 for piece in 'rRbB'}
+    for row in range(8):
+        for column in range(8):
+            edge = abs(column - 3)
+            index = row * 8 + column
+            square['r'][index] = units(
+                w['red_man_crowning'] if row == 0 else
+                (8 - row) * w['red_man_advance'] +
+                (w['red_man_center'] - edge * w['red_man_edge']))
+            # R's position, a little bit hard coding
+            square['R'][index] = units(
+                (w['red_king_center'] - edge * w['red_king_edge']) +
+                (8 - row) * w['red_king_advance']) + \
+                units(score_board1[row][column] * w['red_king_square'])
+            square['b'][index] = units(
+                w['black_man_crowning'] if row == 7 else
+                (8 - row) * w['black_man_advance'] +
+                (w['black_man_center'] - edge * w['black_man_edge']))
+            square['B'][index] = units(
+                (w['black_king_center'] - edge * w['black_king_edge']) +
+                (8 - row) * w['black_king_advance'])
+    return material, unsafe, backed, square
+
+
+def set_eval_weights(weights):
+    """
+        Make eval(), and everything that scores the way it does, use
+        weights. Weights not given keep their value.
+        :type weights: Dict[str, float]
+    """
+    global batch_tables
+    unknown = sorted(set(weights) - set(EVAL_WEIGHT_NAMES))
+    if unknown:
+        raise ValueError("unknown eval weights %s" % ', '.join(unknown))
+    for name, value in weights.items():
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            raise ValueError("eval weight %s is not a number" % name)
+        globals()[name] = value
+    PIECE_VALUE.update({'r': man_value, 'R': king_value, 'b': -man_value,
+                        'B': -king_value})
+    for table, units in zip((MATERIAL_UNITS, UNSAFE_UNITS, BACKED_UNITS,
+                             SQUARE_UNITS), make_eval_tables(eval_weights())):
+        table.update(units)
+    batch_tables = None
+
+
+def load_eval_weights(filename):
+    """
+        Load the eval() weights of a JSON file, an object of weights by
+        name as written by tune.py, see set_eval_weights
+    """
+    with open(filename) as f:
+        weights = json.load(f)
+    if not isinstance(weights, dict):
+        raise ValueError("%s does not hold an object of weights" % filename)
+    set_eval_weights(weights)
+
+
+set_eval_weights(DEFAULT_EVAL_WEIGHTS)
+
+
+# Batch evaluation. Boards are stacked into an (n, 8, 8) int8 array of
+# BATCH_CODES indices and scored together by batch_eval.
+BATCH_CODES = '.rRbB'
+batch_tables = None  # make_batch_tables of the current weights, made on use
+if np is not None:
+    BATCH_CODE_OF_BYTE = np.zeros(256, dtype=np.int8)
+    for _code, _piece in enumerate(BATCH_CODES):
+        BATCH_CODE_OF_BYTE[ord(_piece)] = _code
+    # y * 8 + x of each playable square, in square order
+    BATCH_DARK_INDEX = np.array([y * 8 + x for x, y in SQUARE_XY])
+    BATCH_MEN = np.array([0, 1, 0, -1, 0])
+    BATCH_KINGS = np.array([0, 0, 1, 0, -1])
+    BATCH_ROWS = np.arange(8)[:, None]
+    BATCH_COLUMNS = np.arange(8)[None, :]
+
+
+def make_batch_tables(weights):
+    """
+        Returns the tables batch_eval scores boards with under the eval()
+        weights in weights, keyed by EVAL_WEIGHT_NAMES: the man and king
+        values, then for each BATCH_CODES piece the safety term looked up
+        from it and its four diagonal neighbours, the term it gets wherever
+        it stands and its score_board1 term. Every entry is linear in the
+        weights.
+        :type weights: Dict[str, float]
+        :rtype: Tuple[float, float, numpy.ndarray, numpy.ndarray,
+        numpy.ndarray]
+    """
+    w = weights
+    # placed[code, row, column] is the term add_square_score adds for the
+    # piece wherever it stands, before score_board1
+    placed = np.zeros((len(BATCH_CODES), 8, 8))
+    for row in range(8):
+        for column in range(8):
+            edge = abs(column - 3)
+            placed[1, row, column] = w['red_man_crowning'] if row == 0 else \
+                (8 - row) * w['red_man_advance'] + \
+                (w['red_man_center'] - edge * w['red_man_edge'])
+            placed[2, row, column] = \
+                (w['red_king_center'] - edge * w['red_king_edge']) + \
+                (8 - row) * w['red_king_advance']
+            placed[3, row, column] = w['black_man_crowning'] if row == 7 \
+                else (8 - row) * w['black_man_advance'] + \
+                (w['black_man_center'] - edge * w['black_man_edge'])
+            placed[4, row, column] = \
+                (w['black_king_center'] - edge * w['black_king_edge']) + \
+                (8 - row) * w['black_king_advance']
+    # score_board1 counts for red kings only
+    king_board = np.zeros((len(BATCH_CODES), 8, 8))
+    king_board[2] = np.array(score_board1) * w['red_king_square']
+    # safety[((((piece * 5 + up left) * 5 + up right) * 5 + down left) * 5
+    # + down right] is the safety or backing term of a piece off the edge
+    safety = np.zeros(5 ** 5)
+    for index in range(5 ** 5):
+        piece, up_left, up_right, down_left, down_right = \
+            [BATCH_CODES[index // 5 ** power % 5]
+             for power in range(4, -1, -1)]
+        board = [[up_left, '.', up_right],
+                 ['.', piece, '.'],
+                 [down_left, '.', down_right]]
+        if piece in ['r', 'R']:
+            if not is_safe_r(board, 1, 1):
+                safety[index] = w['red_man_unsafe'] if piece == 'r' else \
+                    w['red_king_unsafe']
+            elif piece == 'r' and is_enhance_r(board, 1, 1):
+                safety[index] = w['red_man_backed']
+        elif piece in ['b', 'B']:
+            if not is_safe_b(board, 1, 1):
+                safety[index] = w['black_man_unsafe'] if piece == 'b' else \
+                    w['black_king_unsafe']
+            elif piece == 'b' and is_enhance_b(board, 1, 1):
+                safety[index] = w['black_man_backed']
+    return w['man_value'], w['king_value'], safety, placed, king_board
+
+
+def encode_boards(boards):
+    """
+        Returns list of lists boards stacked as an (n, 8, 8) int8 array of
+        BATCH_CODES indices
+        :type boards: List[List[List[str]]]
+        :rtype: numpy.ndarray
+    """
+    data = ''.join(''.join(row) for board in boards for row in board)
+    return BATCH_CODE_OF_BYTE[np.frombuffer(data.encode('ascii'),
+                                            dtype=np.uint8)].reshape(-1, 8, 8)
+
+
+def encode_masks(masks):
+    """
+        Returns the positions given by their (red men, red kings, black men,
+        black kings) masks as an (n, 8, 8) int8 array, see encode_boards
+        :type masks: List[Tuple[int, int, int, int]]
+        :rtype: numpy.ndarray
+    """
+    masks = np.array(masks, dtype=np.uint32).reshape(-1, 4)
+    bits = (masks[:, :, None] >> np.arange(32, dtype=np.uint32)) & 1
+    codes = np.zeros((len(masks), 64), dtype=np.int8)
+    codes[:, BATCH_DARK_INDEX] = bits[:, 0] + 2 * bits[:, 1] + \
+        3 * bits[:, 2] + 4 * bits[:, 3]
+    return codes.reshape(-1, 8, 8)
+
+
+def batch_eval(codes, tables=None):
+    """
+        Returns full_eval() of every board in codes. Each board's terms are
+        laid out in the order full_eval adds them, zero where full_eval
+        adds nothing, and summed left to right, so the floats match
+        exactly.
+        :param codes: boards as made by encode_boards or encode_masks
+        :type codes: numpy.ndarray
+        :param tables: made by make_batch_tables, by default for the
+        weights eval() uses
+        :rtype: numpy.ndarray
+    """
+    global batch_tables
+    if tables is None:
+        if batch_tables is None:
+            batch_tables = make_batch_tables(eval_weights())
+        tables = batch_tables
+    man, king, safety_table, placed_table, king_table = tables
+    n = len(codes)
+    material = man * BATCH_MEN[codes].sum(2) + \
+        king * BATCH_KINGS[codes].sum(2)
+    # the safety and backing terms of the squares off the edge look up the
+    # piece and its four diagonal neighbours; on the edge they are zero
+    wide = codes.astype(np.int16)
+    safety = np.zeros(codes.shape)
+    safety[:, 1:-1, 1:-1] = safety_table[
+        wide[:, 1:-1, 1:-1] * 625 + wide[:, :-2, :-2] * 125 +
+        wide[:, :-2, 2:] * 25 + wide[:, 2:, :-2] * 5 + wide[:, 2:, 2:]]
+    placed = placed_table[codes, BATCH_ROWS, BATCH_COLUMNS]
+    king_board = king_table[codes, BATCH_ROWS, BATCH_COLUMNS]
+    terms = np.concatenate(
+        [material, np.stack([safety, placed, king_board], axis=3)
+         .reshape(n, 192)], axis=1)
+    return np.add.accumulate(terms, axis=1)[:, -1]
+
+
+def leaf_scores(s, moves):
+    """
+        Returns full_eval() of the successor after each of moves, scored
+        in one batch, or None for a successor that repeats a position
+        :rtype: List[float]
+    """
+    keys = []
+    if isinstance(s, BitState):
+        masks = []
+        for move in moves:
+            successor = s.play(move)
+            keys.append(successor.key)
+            masks.append((successor.red_men, successor.red_kings,
+                          successor.black_men, successor.black_kings))
+        scores = batch_eval(encode_masks(masks)).tolist()
+    else:
+        boards = []
+        for move in moves:
+            successor = s.play(move)
+            keys.append(successor.key)
+            boards.append([''.join(row) for row in successor.board])
+            s.unplay(move)
+        scores = batch_eval(encode_boards(boards)).tolist()
+    if search_repetitions:
+        scores = [None if key in repetition_keys else score
+                  for key, score in zip(keys, scores)]
+    return scores
+
+
+def leaf_value(value, ply):
+    """
+        Account for a leaf at ply whose score leaf_scores worked out, the
+        way negamax would when reaching it, and return it, for red.
+        A repeated position (None) is a draw.
+        :rtype: float
+    """
+    count_node(ply)
+    pv_table[ply] = ()
+    if value is None:
+        return 0
+    if search_stats is not None:
+        search_stats.evaluations += 1
+    return value
+
+
+class TranspositionTable:
+    # Fixed size table of search results keyed by Zobrist hash. Each slot
+    # holds one (key, depth, value, bound, best move, generation) tuple, so
+    # memory stays bounded however long the game runs.
+    # rough size of one stored entry including its key, value and move
+    ENTRY_BYTES = 256
+
+    def __init__(self, size_mb=16, policy='depth'):
+        """
+            :param size_mb: memory cap of the table in megabytes
+            :type size_mb: float
+            :param policy: 'depth' keeps the deeper of two colliding entries
+            from the current search, 'always' lets the newest one win
+            :type policy: str
+        """
+        slots = max(1, int(size_mb * 2 ** 20) // self.ENTRY_BYTES)
+        self.size = 1 << (slots.bit_length() - 1)
+        self.mask = self.size - 1
+        self.policy = policy
+        self.generation = 0
+        self.slots = [None] * self.size
+
+    def probe(self, key):
+        """
+            Returns the entry stored for key or None
+            :rtype: Tuple
+        """
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, value, bound, move):
+        """
+            Record a search result, subject to the replacement policy
+        """
+        index = key & self.mask
+        old = self.slots[index]
+        if self.policy == 'depth' and old is not None and old[0] != key \
+                and old[5] == self.generation and old[1] > depth:
+            return
+        self.slots[index] = (key, depth, value, bound, move, self.generation)
+
+    def new_search(self):
+        """
+            Mark entries from earlier searches as replaceable
+        """
+        self.generation += 1
+
+
+class Tablebase:
+    # Read-only view of a tablebase file. The file is memory-mapped and
+    # records are found by binary search, so opening it costs nothing and
+    # the operating system pages in only the records that are probed.
+
+    def __init__(self, filename):
+        """
+            :param filename: file written by tablebase.py
+            :type filename: str
+            :raises ValueError: if the file is not a tablebase
+        """
+        with open(filename, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) < TB_HEADER.size:
+            raise ValueError("%s is not a tablebase" % filename)
+        magic, version, self.max_pieces, self.count = \
+            TB_HEADER.unpack_from(self.data)
+        if magic == TB_MAGIC and version != TB_VERSION:
+            raise ValueError("%s was written by another version of "
+                             "tablebase.py, generate it again" % filename)
+        if magic != TB_MAGIC or \
+                len(self.data) != TB_HEADER.size + self.count * TB_RECORD.size:
+            raise ValueError("%s is not a tablebase" % filename)
+
+    def lookup(self, key):
+        """
+            Returns the (result, distance) recorded for key, or None for a
+            draw
+            :type key: bytes
+            :rtype: Tuple[int, int]
+        """
+        data = self.data
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            offset = TB_HEADER.size + middle * TB_RECORD.size
+            stored = data[offset:offset + TB_KEY_BYTES]
+            if stored < key:
+                low = middle + 1
+            elif stored > key:
+                high = middle
+            else:
+                return TB_RECORD.unpack_from(data, offset)[1:]
+        return None
+
+    def probe(self, s):
+        """
+            Returns the exact value of s, from red's point of view like
+            eval(), or None if s has more pieces than the tablebase covers.
+            A side without pieces has lost.
+            :type s: State or BitState
+            :rtype: float
+        """
+        # the same checks in the same order for every backend: a side
+        # without pieces has lost however many the other side has left
+        if isinstance(s, BitState):
+            masks = (s.red_men, s.red_kings, s.black_men, s.black_kings)
+            red = bin(masks[0] | masks[1]).count('1')
+            black = bin(masks[2] | masks[3]).count('1')
+        else:
+            red = sum(row.count('r') + row.count('R') for row in s.board)
+            black = sum(row.count('b') + row.count('B') for row in s.board)
+        if not red:
+            return -TB_WIN_SCORE
+        if not black:
+            return TB_WIN_SCORE
+        if red + black > self.max_pieces:
+            return None
+        if not isinstance(s, BitState):
+            try:
+                masks = board_masks(s.board)
+            except ValueError:
+                return None
+        red_to_move = s.cur_turn == player
+        entry = self.lookup(tablebase_key(masks, red_to_move))
+        if entry is None:
+            return 0
+        result, distance = entry
+        value = TB_WIN_SCORE - distance
+        if (result == TB_WIN) != red_to_move:
+            value = -value
+        return value
+
+
+class SearchStats:
+    # Counters the search fills in while --stats-json is on. Every hook in
+    # the search is guarded by "if search_stats is not None", so they cost
+    # one global lookup when it is off. Counters run per move; end_move
+    # files them away and starts the next move from zero.
+
+    def __init__(self):
+        self.moves = []
+        self.start_move()
+
+    def start_move(self):
+        """
+            Zero the counters of the move about to be searched
+        """
+        self.nodes_by_ply = [0] * (MAX_PLY + 1)
+        self.evaluations = 0
+        self.beta_cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tt_cutoffs = 0
+        self.tablebase_hits = 0
+        self.playouts = 0
+        self.first_move_seconds = None
+        self.nodes_before = nodes_searched
+        self.start = time.time()
+
+    def record_first_move(self):
+        """
+            Note the time when the search first had a move to play
+        """
+        if self.first_move_seconds is None:
+            self.first_move_seconds = time.time() - self.start
+
+    def record_cutoff(self, first):
+        """
+            Count a beta cutoff, and whether the first move searched at
+            the node caused it
+        """
+        self.beta_cutoffs += 1
+        if first:
+            self.first_move_cutoffs += 1
+
+    def record_probe(self, hit):
+        """
+            Count a transposition table probe and whether it found the
+            position
+        """
+        self.tt_probes += 1
+        if hit:
+            self.tt_hits += 1
+
+    def end_move(self, s, move, v, depth):
+        """
+            Record the counters of the move searched from s, which chose
+            move with value v after completing the given depth
+        """
+        nodes_by_ply = self.nodes_by_ply
+        while nodes_by_ply and not nodes_by_ply[-1]:
+            nodes_by_ply = nodes_by_ply[:-1]
+        self.moves.append({
+            'ply': len(self.moves),
+            'side': 'r' if s.cur_turn == player else 'b',
+            'move': [list(square) for square in move.path]
+            if move is not None else None,
+            'value': json_number(v),
+            'depth': depth,
+            'seconds': time.time() - self.start,
+            'first_move_seconds': self.first_move_seconds,
+            # includes nodes searched by --threads workers, which the other
+            # counters leave out
+            'nodes': nodes_searched - self.nodes_before,
+            'nodes_by_ply': nodes_by_ply,
+            'evaluations': self.evaluations,
+            'beta_cutoffs': self.beta_cutoffs,
+            'first_move_cutoffs': self.first_move_cutoffs,
+            'tt_probes': self.tt_probes,
+            'tt_hits': self.tt_hits,
+            'tt_cutoffs': self.tt_cutoffs,
+            'tablebase_hits': self.tablebase_hits,
+            'playouts': self.playouts,
+        })
+        self.start_move()
+
+    def game(self):
+        """
+            Returns the counters summed over every move of the game
+            :rtype: Dict
+        """
+        totals = {'moves': len(self.moves)}
+        for name in ('seconds', 'first_move_seconds', 'nodes',
+                     'evaluations', 'beta_cutoffs',
+                     'first_move_cutoffs', 'tt_probes', 'tt_hits',
+                     'tt_cutoffs', 'tablebase_hits', 'playouts'):
+            # first_move_seconds is None for a position without moves
+            totals[name] = sum(move[name] for move in self.moves
+                               if move[name] is not None)
+        nodes_by_ply = []
+        for move in self.moves:
+            for ply, nodes in enumerate(move['nodes_by_ply']):
+                if ply == len(nodes_by_ply):
+                    nodes_by_ply.append(0)
+                nodes_by_ply[ply] += nodes
+        totals['nodes_by_ply'] = nodes_by_ply
+        totals['first_move_cutoff_rate'] = \
+            totals['first_move_cutoffs'] / totals['beta_cutoffs'] \
+            if totals['beta_cutoffs'] else None
+        totals['tt_hit_rate'] = totals['tt_hits'] / totals['tt_probes'] \
+            if totals['tt_probes'] else None
+        return totals
+
+    def write(self, filename):
+        """
+            Write the per move and per game counters as JSON
+        """
+        with open(filename, 'w') as f:
+            json.dump({'moves': self.moves, 'game': self.game()}, f,
+                      indent=2)
+            f.write('\n')
+
+
+def json_number(v):
+    """
+        Returns v as JSON can hold it: infinite values become "inf" or
+        "-inf"
+    """
+    if v is not None and v in (float('inf'), float('-inf')):
+        return str(v)
+    return v
+
+
+class PositionCache:
+    # Search results kept in an SQLite file across runs, as transposition
+    # table entries (depth, value, bound, best move) keyed by Zobrist hash.
+    # Rows are tagged with the search settings that produced them, since
+    # values from another evaluation would be wrong. The rows for the
+    # current settings are read into memory on the first probe; new results
+    # are collected in memory and written in one transaction by flush. The
+    # file is in WAL mode so batch workers can read while one of them
+    # writes. Past max_entries rows the least recently used are evicted.
+    # shallower results are not worth a row
+    MIN_DEPTH = 2
+
+    def __init__(self, filename, max_entries, config):
+        """
+            :param filename: the SQLite file, created if missing
+            :type filename: str
+            :param max_entries: most rows kept in the file
+            :type max_entries: int
+            :param config: the search settings the results belong to
+            :type config: str
+        """
+        self.filename = filename
+        self.max_entries = max_entries
+        self.config = config
+        self.entries = None
+        self.pending = {}
+        self.used = set()
+
+    def connect(self):
+        """
+            Open the file, creating the table on first use
+            :rtype: sqlite3.Connection
+        """
+        connection = sqlite3.connect(self.filename, timeout=60)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS positions ("
+            "config TEXT, key INTEGER, depth INTEGER, value REAL, "
+            "bound INTEGER, move TEXT, stamp INTEGER, "
+            "PRIMARY KEY (config, key))")
+        return connection
+
+    def load(self):
+        """
+            Read the rows of the current settings into memory
+        """
+        connection = self.connect()
+        try:
+            rows = connection.execute(
+                "SELECT key, depth, value, bound, move FROM positions "
+                "WHERE config = ?", (self.config,)).fetchall()
+        finally:
+            connection.close()
+        self.entries = {}
+        for key, depth, value, bound, move in rows:
+            key &= 2 ** 64 - 1
+            path = tuple(tuple(square) for square in json.loads(move)) \
+                if move is not None else None
+            self.entries[key] = (key, depth, value, bound, path, 0)
+
+    def probe(self, key):
+        """
+            Returns the entry stored for key or None, in the form of a
+            TranspositionTable entry
+            :rtype: Tuple
+        """
+        if self.entries is None:
+            self.load()
+        entry = self.pending.get(key) or self.entries.get(key)
+        if entry is not None:
+            self.used.add(key)
+        return entry
+
+    def store(self, key, depth, value, bound, move):
+        """
+            Remember a search result to be written by the next flush, unless
+            a deeper one is known
+        """
+        if depth < self.MIN_DEPTH:
+            return
+        old = self.probe(key)
+        if old is not None and old[1] > depth:
+            return
+        self.pending[key] = (key, depth, value, bound, move, 0)
+
+    def store_table(self, table):
+        """
+            Remember every entry of a TranspositionTable deep enough to keep
+        """
+        for entry in table.slots:
+            if entry is not None:
+                self.store(*entry[:5])
+
+    def flush(self):
+        """
+            Write the remembered results and the use of the rows read, in
+            one transaction, then evict the least recently used rows past
+            max_entries
+        """
+        if not self.pending and not self.used:
+            return
+        stamp = int(time.time() * 1000)
+        rows = [(self.config, key - 2 ** 64 if key >= 2 ** 63 else key,
+                 depth, value, bound,
+                 json.dumps(move) if move is not None else None, stamp)
+                for key, depth, value, bound, move, generation
+                in self.pending.values()]
+        used = [(stamp, self.config, key - 2 ** 64 if key >= 2 ** 63 else key)
+                for key in self.used]
+        connection = self.connect()
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT INTO positions VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (config, key) DO UPDATE SET "
+                    "depth = excluded.depth, value = excluded.value, "
+                    "bound = excluded.bound, move = excluded.move, "
+                    "stamp = excluded.stamp "
+                    "WHERE excluded.depth >= positions.depth", rows)
+                connection.executemany(
+                    "UPDATE positions SET stamp = ? WHERE config = ? AND "
+                    "key = ?", used)
+                excess = connection.execute(
+                    "SELECT COUNT(*) FROM positions").fetchone()[0] - \
+                    self.max_entries
+                if excess > 0:
+                    connection.execute(
+                        "DELETE FROM positions WHERE rowid IN (SELECT rowid "
+                        "FROM positions ORDER BY stamp, depth LIMIT ?)",
+                        (excess,))
+        finally:
+            connection.close()
+        self.entries.update(self.pending)
+        self.pending.clear()
+        self.used.clear()
+
+
+def cache_config():
+    """
+        Returns the search settings that change what a search result means,
+        as the tag of its PositionCache rows
+        :rtype: str
+    """
+    config = "eval=%s quiescence=%d tablebase=%s" % (
+        "incremental" if incremental_eval else "full", quiescence_depth,
+        tablebase.max_pieces if tablebase is not None else 0)
+    weights = eval_weights()
+    if weights != DEFAULT_EVAL_WEIGHTS:
+        config += " weights=%s" % hashlib.sha1(json.dumps(
+            weights, sort_keys=True).encode()).hexdigest()[:16]
+    return config
+
+
+def save_cache():
+    """
+        Hand the deep entries of the transposition table to the position
+        cache and write everything it collected
+    """
+    if position_cache is None:
+        return
+    if transposition_table is not None:
+        position_cache.store_table(transposition_table)
+    position_cache.flush()
+
+
+def cutoff_test(s, depth):
+    """
+        Returns list of states after piece makes jump.
+        With quiescence on, a state at or past depth 0 is only a leaf once
+        it is quiet, that is the side to move has no jump (the jumps are
+        then the only moves, see iter_moves), or once the extension reaches
+        quiescence_depth. The leaf's static eval() is its stand-pat score:
+        jumping is mandatory, so it cannot serve as a bound mid-sequence.
+        :param depth: The depth of state
+        :type depth: int
+        :param s: The State of board.
+        :type s: State
+        :return: a boolean that indicates if state is terminal state
+        :rtype: Boolean
+    """
+    if depth <= 0:
+        return depth <= -quiescence_depth or not s.must_jump()
+    return s.is_eliminated()
+
+
+def get_solution(final_state):
+    """
+            :param final_state: final state
+            :type final_state: State
+            :rtype: List[State]
+    """
+    # tracing through from goal state to initial state
+    walk_through = []
+    while final_state is not None:
+        walk_through.append(final_state)
+        final_state = final_state.parent
+    return walk_through[::-1]
+
+
+def tt_lookup(s, alpha, beta, depth, ply):
+    """
+        Look s up in the transposition table, then in the position cache.
+        :return: the stored value if the entry is deep and tight enough to
+        stand in for searching s (never at the root, since its caller needs
+        a move), and the best move to try first. Either may be None.
+        :rtype: Tuple[float, Tuple]
+    """
+    hint = root_move_hint if ply == 0 else None
+    entry = None
+    if transposition_table is not None:
+        entry = transposition_table.probe(s.key)
+        if search_stats is not None:
+            search_stats.record_probe(entry is not None)
+    if entry is None and position_cache is not None:
+        entry = position_cache.probe(s.key)
+    if entry is None:
+        return None, hint
+    if entry[4] is not None:
+        hint = entry[4]
+    if ply == 0 or entry[1] < depth:
+        return None, hint
+    value, bound = entry[2], entry[3]
+    if bound == EXACT or (bound == LOWER and value >= beta) or \
+            (bound == UPPER and value <= alpha):
+        if search_stats is not None:
+            search_stats.tt_cutoffs += 1
+        return value, hint
+    return None, hint
+
+
+def hint_first(moves, hint):
+    """
+        Returns moves with the hint move in front, the rest keep their
+        order. Without a hint the moves are passed through untouched, so a
+        generator stays lazy.
+        :rtype: Iterable[Move]
+    """
+    if hint is None:
+        return moves
+    moves = list(moves)
+    for i, move in enumerate(moves):
+        if move.path == hint:
+            if i:
+                moves.insert(0, moves.pop(i))
+            break
+    return moves
+
+
+def scan_ranks(moves, hint):
+    """
+        Returns the rank of each move by path in the order move ordering off
+        searches them: the hint move, then board-scan order. Equal root
+        moves are played in this order, whatever order they were searched
+        in, so the move played does not depend on the ordering tables or on
+        --threads.
+        :rtype: Dict[Tuple, Tuple[bool, int]]
+    """
+    return {move.path: (move.path != hint, i) for i, move in enumerate(moves)}
+
+
+def order_moves(moves, ply, hint):
+    """
+        Sort moves so the likeliest cutoffs are searched first: the hint
+        (transposition table or previous iteration) move, then captures by
+        length and promotions, then the killer moves of this ply, then quiet
+        moves by history score. With move_ordering off only the hint move
+        is moved to the front.
+        :rtype: Iterable[Move]
+    """
+    if not move_ordering:
+        return hint_first(moves, hint)
+    killers = killer_moves[ply] if ply < MAX_PLY else ()
+
+    def rank(move):
+        path = move.path
+        if path == hint:
+            return 0, 0
+        if move.captured or move.promotion:
+            return 1, -(2 * len(move.captured) + move.promotion)
+        if path in killers:
+            return 2, killers.index(path)
+        return 3, -history_scores.get((path[0], path[-1]), 0)
+    return sorted(moves, key=rank)
+
+
+def record_cutoff(move, depth, ply):
+    """
+        Remember a quiet move that caused a beta cutoff as a killer of its
+        ply and credit its history score
+    """
+    if not move_ordering or move is None or move.captured:
+        return
+    path = move.path
+    if ply < MAX_PLY and killer_moves[ply][0] != path:
+        killer_moves[ply][1] = killer_moves[ply][0]
+        killer_moves[ply][0] = path
+    from_to = (path[0], path[-1])
+    history_scores[from_to] = history_scores.get(from_to, 0) + depth * depth
+
+
+def reset_ordering(plies_ahead=None):
+    """
+        Age the history scores before searching a new move. Killer moves
+        belong to the last searched position: when the game went on along
+        its principal variation they move up by the plies played since,
+        otherwise they are forgotten.
+    """
+    if plies_ahead is not None:
+        killer_moves[:] = killer_moves[plies_ahead:] + \
+            [[None, None] for _ in range(plies_ahead)]
+    else:
+        for killers in killer_moves:
+            killers[0] = killers[1] = None
+    for from_to in list(history_scores):
+        history_scores[from_to] //= 2
+        if not history_scores[from_to]:
+            del history_scores[from_to]
+
+
+def count_node(ply=0):
+    """
+        Count a searched node and stop the search once the time budget of
+        the move or of the puzzle is spent
+    """
+    global nodes_searched
+    nodes_searched += 1
+    if search_stats is not None:
+        search_stats.nodes_by_ply[ply] += 1
+    if nodes_searched & 255 or \
+            (search_deadline is None and puzzle_deadline is None):
+        return
+    now = time.time()
+    if puzzle_deadline is not None and now >= puzzle_deadline:
+        raise PuzzleTimeout()
+    if search_deadline is not None and now >= search_deadline:
+        raise SearchTimeout()
+
+
+def tt_store(s, alpha, beta, depth, v, best_move):
+    """
+        Record the result of searching s with window (alpha, beta)
+    """
+    if transposition_table is None:
+        return
+    if v >= beta:
+        bound = LOWER
+    elif v <= alpha:
+        bound = UPPER
+    else:
+        bound = EXACT
+    path = best_move.path if best_move is not None else None
+    transposition_table.store(s.key, depth, v, bound, path)
+
+
+def negamax(s, alpha, beta, depth, ply=0):
+    """
+        Alpha-beta search from the point of view of the side to move: the
+        value is red's score when red is to move and its negation when
+        black is. eval(), the tablebase and the transposition table keep
+        scoring positions for red, so their values and windows are turned
+        around for black. s may be a State or BitState, whose play()
+        returns a new successor, or a Position, whose play() changes the
+        board in place until unplay() takes the move back. With pvs the
+        first move gets the (alpha, beta) window and the others a null
+        window, which only tells whether they beat alpha; a move that does
+        is searched again with the full window.
+        :return: the best move (None at a leaf or without moves) and its
+        value
+        :rtype: Tuple[Move, float]
+    """
+    chosen_move = None
+    count_node(ply)
+    pv_table[ply] = ()
+    if ply and search_repetitions and s.key in repetition_keys:
+        return chosen_move, 0
+    sign = 1 if s.cur_turn == player else -1
+    if ply and tablebase is not None:
+        # an exact result for the position ends the search here
+        known = tablebase.probe(s)
+        if known is not None:
+            if search_stats is not None:
+                search_stats.tablebase_hits += 1
+            return chosen_move, sign * known
+    if cutoff_test(s, depth):
+        if search_stats is not None:
+            search_stats.evaluations += 1
+        return chosen_move, sign * s.eval()
+    red_alpha, red_beta = (alpha, beta) if sign > 0 else (-beta, -alpha)
+    stored, hint = tt_lookup(s, red_alpha, red_beta, depth, ply)
+    if stored is not None:
+        return chosen_move, sign * stored
+    v = float('-inf')
+    if ply and search_repetitions:
+        repetition_keys.add(s.key)
+    # children are only built as the search reaches them
+    ranks = None
+    if ply or not move_ordering:
+        moves = order_moves(s.iter_moves(), ply, hint)
+    else:
+        moves = list(s.iter_moves())
+        ranks = scan_ranks(moves, hint)
+        moves = order_moves(moves, ply, hint)
+    leaf_values = None
+    if depth == 1 and batch_eval_leaves and tablebase is None and \
+            not quiescence_depth:
+        # every child is a leaf: score them together
+        moves = list(moves)
+        leaf_values = leaf_scores(s, moves)
+    for i, move in enumerate(moves):
+        # a root move ranked before the best one so far takes its place on
+        # an equal value, so the window is opened just below alpha to tell
+        tie = ranks is not None and chosen_move is not None and \
+            v == alpha and ranks[move.path] < ranks[chosen_move.path]
+        lower = math.nextafter(alpha, float('-inf')) if tie else alpha
+        if leaf_values is not None:
+            successor_v = sign * leaf_value(leaf_values[i], ply + 1)
+        else:
+            successor = s.play(move)
+            if i and pvs:
+                no_use_object, successor_v = negamax(
+                    successor, -math.nextafter(lower, float('inf')), -lower,
+                    depth - 1, ply + 1)
+                successor_v = -successor_v
+                if lower < successor_v < beta:
+                    no_use_object, successor_v = negamax(
+                        successor, -beta, -lower, depth - 1, ply + 1)
+                    successor_v = -successor_v
+            else:
+                no_use_object, successor_v = negamax(
+                    successor, -beta, -lower, depth - 1, ply + 1)
+                successor_v = -successor_v
+            s.unplay(move)
+        if v < successor_v or (tie and v == successor_v):
+            v = successor_v
+            chosen_move = move
+            pv_table[ply] = (move,) + pv_table[ply + 1]
+        if v >= beta:
+            if search_stats is not None:
+                search_stats.record_cutoff(i == 0)
+            record_cutoff(chosen_move, depth, ply)
+            break
+        alpha = max(alpha, v)
+    tt_store(s, red_alpha, red_beta, depth, sign * v, chosen_move)
+    if ply and search_repetitions:
+        repetition_keys.discard(s.key)
+    return chosen_move, v
+
+
+def search_root(s, depth, guess=None):
+    """
+        Search s to depth. With pvs and the value of the previous iteration
+        as guess, the search starts in an aspiration window around it; a
+        value falling out of the window only bounds the true one, so that
+        side of the window is widened and the search repeated until the
+        value lands inside.
+        :param guess: red's value of s, or None for a full window
+        :return: the best move and red's value of it
+        :rtype: Tuple[Move, float]
+    """
+    sign = 1 if s.cur_turn == player else -1
+    alpha, beta = float('-inf'), float('inf')
+    if pvs and guess is not None and not math.isinf(guess):
+        lower = upper = ASPIRATION_WINDOW
+        alpha, beta = sign * guess - lower, sign * guess + upper
+    while True:
+        move, v = negamax(s, alpha, beta, depth)
+        if v <= alpha and not math.isinf(alpha):
+            lower *= ASPIRATION_GROWTH
+            alpha = sign * guess - lower \
+                if lower < TB_WIN_SCORE else float('-inf')
+        elif v >= beta and not math.isinf(beta):
+            upper *= ASPIRATION_GROWTH
+            beta = sign * guess + upper \
+                if upper < TB_WIN_SCORE else float('inf')
+        else:
+            return move, sign * v
+
+
+def search_move(s):
+    """
+        Search the move for whoever is to move in s by iterative deepening:
+        depth 1, 2, 3... up to max_depth or until time_per_move runs out.
+        Each iteration tries the best moves of the previous one first.
+        With the in-place core the whole search runs on one Position.
+        What earlier searches learnt is carried forward: if the game
+        followed the principal variation of the last move, the rest of it is
+        the first guess and the killer moves move up with it, and an exact
+        result already stored for s (by an earlier search that looked
+        ahead, or by pondering) is played or deepened instead of searched
+        again from depth 1.
+        :return: the chosen successor (None if there is no move) and its
+        value, both from the last completed iteration
+        :rtype: Tuple[State, float]
+    """
+    global search_deadline, root_move_hint, principal_variation, \
+        expected_lines, searches_started
+    start = time.time()
+    searches_started += 1
+    if search_stats is not None:
+        search_stats.start_move()
+    plies_ahead, principal_variation = expected_lines.get(s.key,
+                                                          (None, ()))
+    root_move_hint = principal_variation[0].path \
+        if principal_variation else None
+    move, v = None, None
+    completed = 0
+    known = known_result(s)
+    if known is not None:
+        completed, move, v = known
+        root_move_hint = move.path
+        if principal_variation[:1] != (move,):
+            principal_variation = (move,)
+        if search_stats is not None:
+            search_stats.record_first_move()
+    if transposition_table is not None:
+        transposition_table.new_search()
+    if move_ordering:
+        reset_ordering(plies_ahead)
+    root = Position.from_state(s) if search_core == "inplace" else s
+    # the first iteration always completes so there is a move to play,
+    # unless an earlier search left one
+    search_deadline = None
+    if move is not None and time_per_move is not None:
+        search_deadline = start + time_per_move
+    game_keys = set(repetition_keys)
+    try:
+        for depth in range(completed + 1, max_depth + 1):
+            if search_pool is not None and depth >= PARALLEL_MIN_DEPTH:
+                move, v = split_root(root, depth)
+            else:
+                move, v = search_root(root, depth, v)
+            completed = depth
+            if move is None:
+                break
+            principal_variation = pv_table[0]
+            root_move_hint = move.path
+            if search_stats is not None:
+                search_stats.record_first_move()
+            if time_per_move is not None:
+                search_deadline = start + time_per_move
+                if time.time() >= search_deadline:
+                    break
+    except SearchTimeout:
+        pass
+    finally:
+        search_deadline = None
+        root_move_hint = None
+        # an interrupted search leaves its path behind
+        repetition_keys.intersection_update(game_keys)
+    if search_stats is not None:
+        search_stats.end_move(s, move, v, completed)
+    if position_cache is not None and move is not None:
+        position_cache.store(s.key, completed, v, EXACT, move.path)
+    if move is None:
+        expected_lines = {}
+        return None, v
+    next_state = s.play(move)
+    expected_lines = expect_line(next_state, principal_variation[1:])
+    return next_state, v
+
+
+def known_result(s):
+    """
+        Returns the exact result stored for s in the transposition table,
+        or else the position cache, as (depth, move, value), if there is one
+        with a legal move
+        :rtype: Tuple[int, Move, float]
+    """
+    for table in (transposition_table, position_cache):
+        entry = table.probe(s.key) if table is not None else None
+        if entry is None or entry[3] != EXACT or entry[4] is None:
+            continue
+        for move in s.iter_moves():
+            if move.path == entry[4]:
+                return entry[1], move, entry[2]
+    return None
+
+
+def expect_line(s, line):
+    """
+        Returns the expected_lines of the game reaching s and going on
+        along line: each position on the way with the plies from s to it
+        and the rest of line from there
+        :rtype: Dict[int, Tuple[int, Tuple[Move]]]
+    """
+    expected = {s.key: (1, line)}
+    for i, move in enumerate(line[:-1]):
+        s = s.play(move)
+        expected[s.key] = (i + 2, line[i + 1:])
+    return expected
+
+
+def split_root(s, depth):
+    """
+        Root splitting for --threads, Young Brothers Wait style: the first
+        root move is searched here, then the rest are shared out to the
+        search_pool workers with the window the first one leaves. Every
+        move beating the first, or equal to it and ranked before it by
+        scan_ranks, gets its exact value, so the move, value and principal
+        variation are the ones search_root would return with a full
+        window.
+        :return: the best move and red's value of it
+        :rtype: Tuple[Move, float]
+    """
+    global nodes_searched
+    sign = 1 if s.cur_turn == player else -1
+    chosen_move = None
+    count_node(0)
+    pv_table[0] = ()
+    if cutoff_test(s, depth):
+        return chosen_move, s.eval()
+    stored, hint = tt_lookup(s, float('-inf'), float('inf'), depth, 0)
+    moves = list(s.iter_moves())
+    ranks = scan_ranks(moves, hint)
+    moves = list(order_moves(moves, 0, hint))
+    if not moves:
+        return chosen_move, -sign * float('inf')
+    chosen_move = moves[0]
+    successor = s.play(chosen_move)
+    no_use_object, v = negamax(successor, float('-inf'), float('inf'),
+                               depth - 1, 1)
+    v = -v
+    s.unplay(chosen_move)
+    pv_table[0] = (chosen_move,) + pv_table[1]
+    rows = [''.join(row) for row in s.board]
+    game_keys = frozenset(repetition_keys)
+    # a move ranked before the first one is searched just below its value,
+    # so that an equal value comes back exact
+    tasks = [(rows, sign > 0, isinstance(s, BitState), move.path,
+              math.nextafter(v, float('-inf'))
+              if ranks[move.path] < ranks[chosen_move.path] else v,
+              depth, search_deadline, game_keys, searches_started)
+             for move in moves[1:]]
+    timed_out = False
+    for move, (move_v, pv, nodes, move_timed_out) in \
+            zip(moves[1:], search_pool.imap(search_root_move, tasks)):
+        nodes_searched += nodes
+        timed_out = timed_out or move_timed_out
+        if timed_out:
+            continue
+        if v < move_v or (v == move_v and
+                          ranks[move.path] < ranks[chosen_move.path]):
+            v = move_v
+            chosen_move = move
+            pv_table[0] = (move,) + pv
+    if timed_out:
+        raise SearchTimeout()
+    tt_store(s, float('-inf'), float('inf'), depth, sign * v, chosen_move)
+    return chosen_move, sign * v
+
+
+def init_search_worker(args):
+    """
+        Pool initializer of the --threads workers: each one keeps its own
+        search settings, transposition table and ordering tables
+    """
+    configure(args)
+    reset_search(args)
+
+
+def search_root_move(task):
+    """
+        Search one root move in a --threads worker. The root is rebuilt
+        from its rows since states link to their whole game history.
+        :param task: root rows, whether red is to move, whether the root is
+        a BitState, path of the move, the value to beat for the side to
+        move, depth, the deadline, the repetition_keys of the game and the
+        searches_started count of the move being searched
+        :return: value of the move for the side to move (only a bound if it
+        does not beat alpha), its principal variation, the nodes searched
+        and whether the deadline stopped the search
+        :rtype: Tuple[float, Tuple[Move], int, bool]
+    """
+    global search_deadline, worker_search
+    rows, maximizing, bitboard, path, alpha, depth, deadline, \
+        game_keys, search = task
+    if search != worker_search:
+        worker_search = search
+        if transposition_table is not None:
+            transposition_table.new_search()
+    repetition_keys.clear()
+    repetition_keys.update(game_keys)
+    board = [list(row) for row in rows]
+    turn = player if maximizing else computer
+    root = BitState.from_board(board, turn) if bitboard else \
+        State(board, turn)
+    if incremental_eval:
+        root.score = root.full_units()
+    if search_core == "inplace":
+        root = Position.from_state(root)
+    move = next(move for move in root.iter_moves() if move.path == path)
+    nodes_before = nodes_searched
+    search_deadline = deadline
+    try:
+        successor = root.play(move)
+        if pvs:
+            # most moves do not beat the first, which a null window shows
+            no_use_object, v = negamax(
+                successor, -math.nextafter(alpha, float('inf')), -alpha,
+                depth - 1, 1)
+            if -v <= alpha:
+                return -v, pv_table[1], nodes_searched - nodes_before, False
+        no_use_object, v = negamax(successor, float('-inf'), -alpha,
+                                   depth - 1, 1)
+        return -v, pv_table[1], nodes_searched - nodes_before, False
+    except SearchTimeout:
+        return None, (), nodes_searched - nodes_before, True
+    finally:
+        search_deadline = None
+
+
+def time_sequential(args):
+    """
+        Play the puzzle of args again on one core, without writing it out,
+        the baseline the --threads run is compared against. The search
+        starts afresh and the position cache is left out, as for the
+        threaded run.
+        :return: the nodes searched and the seconds taken
+        :rtype: Tuple[int, float]
+    """
+    global search_pool, position_cache, search_stats
+    saved = search_pool, position_cache, search_stats
+    search_pool = position_cache = search_stats = None
+    reset_search(args)
+    start = time.time()
+    try:
+        play_game(load_state(args.inputfile, args.backend))
+    finally:
+        search_pool, position_cache, search_stats = saved
+    return nodes_searched, time.time() - start
+
+
+def alpha_beta_search(s):
+    cur_state = s
+    record(cur_state)
+    position_counts = {s.key: 1}
+    repetition_keys.clear()
+    if search_repetitions:
+        repetition_keys.add(s.key)
+    quiet_plies = 0
+    next_state, v = choose_move(s)
+    record(next_state)
+    while next_state is not None:
+        if puzzle_deadline is not None and time.time() >= puzzle_deadline:
+            raise PuzzleTimeout()
+        # the draw rules end the game on the position just reached
+        if is_capture(next_state.move):
+            quiet_plies = 0
+        else:
+            quiet_plies += 1
+        position_counts[next_state.key] = \
+            position_counts.get(next_state.key, 0) + 1
+        if search_repetitions:
+            repetition_keys.add(next_state.key)
+        if (game_repetitions and
+                position_counts[next_state.key] >= REPETITION_LIMIT) or \
+                (move_limit and quiet_plies >= move_limit):
+            return next_state, 0
+        cur_state = next_state
+        next_state, v = choose_move(next_state)
+        record(next_state)
+    return cur_state, v
+
+
+# proof or disproof number of a settled node
+PN_INFINITY = float('inf')
+
+
+class ProofNode:
+    # A node of the proof-number search tree. Red to move makes an OR node,
+    # proven once any child is; black to move an AND node, proven once every
+    # child is. proof and disproof are the proof and disproof numbers;
+    # children stays None until the node is expanded.
+    __slots__ = ('state', 'parent', 'depth', 'moves', 'children', 'proof',
+                 'disproof')
+
+    def __init__(self, state, parent, depth):
+        self.state = state
+        self.parent = parent
+        self.depth = depth
+        self.moves = None
+        self.children = None
+        self.proof = 1
+        self.disproof = 1
+
+
+def pn_evaluate(node, depth_limit):
+    """
+        Set the proof and disproof numbers of a new leaf. A side without
+        moves has lost; a leaf at depth_limit counts as disproven, so only
+        wins within depth_limit plies are proven. Other leaves start from
+        their number of moves.
+    """
+    node.moves = list(node.state.iter_moves())
+    red = node.state.cur_turn == player
+    if not node.moves:
+        node.proof, node.disproof = (PN_INFINITY, 0) if red else \
+            (0, PN_INFINITY)
+    elif node.depth >= depth_limit:
+        node.proof, node.disproof = PN_INFINITY, 0
+    elif red:
+        node.proof, node.disproof = 1, len(node.moves)
+    else:
+        node.proof, node.disproof = len(node.moves), 1
+
+
+def pn_update(node):
+    """
+        Recompute the proof and disproof numbers of an expanded node from
+        its children
+    """
+    if node.state.cur_turn == player:
+        node.proof = min(child.proof for child in node.children)
+        node.disproof = sum(child.disproof for child in node.children)
+    else:
+        node.proof = sum(child.proof for child in node.children)
+        node.disproof = min(child.disproof for child in node.children)
+
+
+def proof_number_search(s, depth_limit):
+    """
+        Proof-number search for a red win within depth_limit plies of s.
+        Each step expands the most-proving leaf and updates its ancestors.
+        :return: the root, proven if root.proof is 0 and disproven if
+        root.disproof is 0 (otherwise the node limit ran out), and the
+        number of nodes built
+        :rtype: Tuple[ProofNode, int]
+    """
+    root = ProofNode(s, None, 0)
+    pn_evaluate(root, depth_limit)
+    nodes = 1
+    while root.proof and root.disproof and nodes < pns_max_nodes:
+        if puzzle_deadline is not None and not nodes & 1023 and \
+                time.time() >= puzzle_deadline:
+            raise PuzzleTimeout()
+        node = root
+        while node.children is not None:
+            if node.state.cur_turn == player:
+                node = next(child for child in node.children
+                            if child.proof == node.proof)
+            else:
+                node = next(child for child in node.children
+                            if child.disproof == node.disproof)
+        node.children = []
+        for move in node.moves:
+            child = ProofNode(node.state.play(move), node, node.depth + 1)
+            pn_evaluate(child, depth_limit)
+            node.children.append(child)
+        node.moves = None
+        nodes += len(node.children)
+        while node is not None:
+            pn_update(node)
+            node = node.parent
+    return root, nodes
+
+
+def proof_line(node):
+    """
+        Returns the number of plies to the win along the proof tree below a
+        proven node, with red taking its quickest proven move and black its
+        longest defence, and the size of that proof tree
+        :rtype: Tuple[int, int]
+    """
+    if node.children is None:
+        return 0, 1
+    lines = [proof_line(child) for child in node.children
+             if child.proof == 0]
+    if node.state.cur_turn == player:
+        plies, size = min(lines)
+        return plies + 1, size + 1
+    return max(plies for plies, size in lines) + 1, \
+        sum(size for plies, size in lines) + 1
+
+
+def pn_search_game(s):
+    """
+        Prove that red wins from s with proof-number search, trying win
+        lengths of 1, 3, 5... plies so the first proof found is the
+        shortest. The proven line is recorded, red taking its
+        quickest win and black its longest defence. Without a proof within
+        pns_max_plies plies or pns_max_nodes nodes the game is played by
+        alpha_beta_search instead.
+        :return: the final state and its value
+        :rtype: Tuple[State, float]
+    """
+    global nodes_searched
+    start = time.time()
+    searched = 0
+    for depth_limit in range(1, pns_max_plies + 1, 2):
+        root, nodes = proof_number_search(s, depth_limit)
+        searched += nodes
+        nodes_searched += nodes
+        if root.proof == 0:
+            plies, size = proof_line(root)
+            print("proved a win in %d plies: proof tree of %d nodes, %d "
+                  "nodes searched in %.3f seconds"
+                  % (plies, size, searched, time.time() - start),
+                  file=sys.stderr)
+            node = root
+            record(node.state)
+            while node.children is not None:
+                lines = [(proof_line(child)[0], child)
+                         for child in node.children if child.proof == 0]
+                if node.state.cur_turn == player:
+                    node = min(lines, key=lambda line: line[0])[1]
+                else:
+                    node = max(lines, key=lambda line: line[0])[1]
+                record(node.state)
+            return node.state, float('inf')
+        if root.disproof != 0:
+            reason = "a proof tree reached %d nodes" % pns_max_nodes
+            break
+    else:
+        reason = "red has no forced win within %d plies" % pns_max_plies
+    print("no win proven, %s (%d nodes searched in %.3f seconds); playing "
+          "it out with alpha-beta" % (reason, searched, time.time() - start),
+          file=sys.stderr)
+    return alpha_beta_search(s)
+
+
+class MctsTree:
+    # Monte Carlo search tree stored in flat arrays indexed by node number
+    # rather than one object per node. The children of a node are numbered
+    # consecutively from first_child (-1 until the node is expanded); a
+    # node's state is only built when the search first goes through it.
+    # wins counts the playouts won by the side that moved into the node,
+    # half a win for a draw.
+
+    def __init__(self, root):
+        """
+            :param root: the position to search
+            :type root: State or BitState
+        """
+        self.parent = array('i', [-1])
+        self.first_child = array('i', [-1])
+        self.child_count = array('i', [0])
+        self.visits = array('i', [0])
+        self.wins = array('d', [0.0])
+        self.red_to_move = array('b', [root.cur_turn == player])
+        self.moves = [None]
+        self.states = [root]
+
+    def state(self, node):
+        """
+            Returns the state of node, playing its move the first time
+            :rtype: State or BitState
+        """
+        s = self.states[node]
+        if s is None:
+            s = self.states[self.parent[node]].play(self.moves[node])
+            self.states[node] = s
+        return s
+
+    def expand(self, node):
+        """
+            Add a child for each move of node
+        """
+        moves = list(self.state(node).iter_moves())
+        self.first_child[node] = len(self.moves)
+        self.child_count[node] = len(moves)
+        red_to_move = not self.red_to_move[node]
+        for move in moves:
+            self.parent.append(node)
+            self.first_child.append(-1)
+            self.child_count.append(0)
+            self.visits.append(0)
+            self.wins.append(0.0)
+            self.red_to_move.append(red_to_move)
+            self.moves.append(move)
+            self.states.append(None)
+
+    def select(self):
+        """
+            Walk down from the root by UCT to a node not played out yet,
+            expanding the node it stops at, and count a visit on every node
+            of the way so the next selection of the same batch spreads out
+            :return: the leaf and the path to it from the root
+            :rtype: Tuple[int, List[int]]
+        """
+        node = 0
+        path = [0]
+        while True:
+            self.visits[node] += 1
+            if self.first_child[node] < 0:
+                if node and self.visits[node] == 1:
+                    return node, path
+                self.expand(node)
+            if not self.child_count[node]:
+                return node, path
+            first = self.first_child[node]
+            log_visits = math.log(self.visits[node])
+            best, best_score = first, float('-inf')
+            for child in range(first, first + self.child_count[node]):
+                visits = self.visits[child]
+                if not visits:
+                    best = child
+                    break
+                score = self.wins[child] / visits + mcts_exploration * \
+                    math.sqrt(log_visits / visits)
+                if score > best_score:
+                    best, best_score = child, score
+            node = best
+            path.append(node)
+
+    def backup(self, path, red_result):
+        """
+            Credit the result of a playout, 1 for a red win, 0 for a black
+            one, to the nodes on path
+        """
+        for node in path:
+            # the side that moved into node is the one not to move there
+            self.wins[node] += 1 - red_result if self.red_to_move[node] \
+                else red_result
+
+    def best_move(self):
+        """
+            Returns the most visited root move, its node and the share of
+            playouts red won through it
+            :rtype: Tuple[Move, int, float]
+        """
+        first = self.first_child[0]
+        best = max(range(first, first + self.child_count[0]),
+                   key=lambda child: self.visits[child])
+        red_share = self.wins[best] / max(self.visits[best], 1)
+        if self.red_to_move[best]:
+            red_share = 1 - red_share
+        return self.moves[best], best, red_share
+
+
+def playout_start(board, cur_turn):
+    """
+        Returns the state a playout from board starts with: a BitState,
+        which plays moves fastest, unless the board has no bitboard form
+        :rtype: State or BitState
+    """
+    try:
+        return BitState.from_board(board, cur_turn)
+    except ValueError:
+        return State(board, cur_turn)
+
+
+def playout(s, rng):
+    """
+        Play s out with random moves. Captures are mandatory already; among
+        the other moves a crowning one is taken when there is one. A game
+        still going after MCTS_PLAYOUT_PLIES plies goes to the side ahead
+        on material, or is drawn.
+        :return: 1 if red wins, 0 if black wins, 0.5 for a draw, and the
+        plies played
+        :rtype: Tuple[float, int]
+    """
+    for ply in range(MCTS_PLAYOUT_PLIES):
+        moves = list(s.iter_moves())
+        if not moves:
+            return (0.0 if s.cur_turn == player else 1.0), ply
+        crowning = [move for move in moves if move.promotion]
+        s = s.play(rng.choice(crowning or moves))
+    material = sum(PIECE_VALUE[piece] for row in s.board for piece in row)
+    return (1.0 if material > 0 else 0.0 if material < 0 else 0.5), \
+        MCTS_PLAYOUT_PLIES
+
+
+def run_playout(task):
+    """
+        Play out one position, in a --threads worker or in the main process.
+        Each playout has its own seed, so its result does not depend on
+        where it runs.
+        :param task: board rows, whether red is to move and the seed
+        :return: the result and plies of the playout, see playout
+        :rtype: Tuple[float, int]
+    """
+    rows, red_to_move, seed = task
+    return playout(playout_start([list(row) for row in rows],
+                                 player if red_to_move else computer),
+                   random.Random(seed))
+
+
+def mcts_move(s):
+    """
+        Choose the move of the side to move in s by Monte Carlo tree search:
+        UCT selection, playouts from the leaves mcts_batch at a time
+        (shared out to search_pool when --threads is given), until
+        mcts_playouts playouts or time_per_move seconds, whichever comes
+        first. The result only depends on the playout budget, not on the
+        number of workers.
+        :return: the successor after the most visited move (None without
+        moves) and red's share of its playouts, scaled to -1..1
+        :rtype: Tuple[State, float]
+    """
+    global nodes_searched, playouts_run
+    start = time.time()
+    deadline = start + time_per_move if time_per_move is not None else None
+    if search_stats is not None:
+        search_stats.start_move()
+    tree = MctsTree(s)
+    # seeded by the position so a playout budget gives the same move
+    rng = random.Random(s.key)
+    playouts = 0
+    while mcts_playouts is None or playouts < mcts_playouts:
+        if puzzle_deadline is not None and time.time() >= puzzle_deadline:
+            raise PuzzleTimeout()
+        if deadline is not None and playouts and time.time() >= deadline:
+            break
+        size = mcts_batch
+        if mcts_playouts is not None:
+            size = min(size, mcts_playouts - playouts)
+        leaves, tasks = [], []
+        for _ in range(size):
+            node, path = tree.select()
+            if not tree.child_count[node] and tree.first_child[node] >= 0:
+                # no moves: the side to move has lost
+                tree.backup(path, 0.0 if tree.red_to_move[node] else 1.0)
+                continue
+            leaves.append(path)
+            leaf = tree.state(node)
+            tasks.append(([''.join(row) for row in leaf.board],
+                          leaf.cur_turn == player, rng.getrandbits(64)))
+        if search_pool is not None and len(tasks) > 1:
+            results = search_pool.map(run_playout, tasks)
+        else:
+            results = list(map(run_playout, tasks))
+        for path, (red_result, plies) in zip(leaves, results):
+            tree.backup(path, red_result)
+            nodes_searched += plies
+        playouts += size
+        if tree.child_count[0] <= 1 and tree.first_child[0] >= 0:
+            # nothing to choose between
+            break
+    playouts_run += playouts
+    nodes_searched += len(tree.moves)
+    if not tree.child_count[0]:
+        if search_stats is not None:
+            search_stats.end_move(s, None, None, 0)
+        return None, float('-inf') if s.cur_turn == player else float('inf')
+    move, node, red_share = tree.best_move()
+    v = 2 * red_share - 1
+    if search_stats is not None:
+        search_stats.playouts = playouts
+        search_stats.end_move(s, move, v, 0)
+    return s.play(move), v
+
+
+def choose_move(s):
+    """
+        Returns the successor and value the chosen engine picks for the side
+        to move in s: Monte Carlo tree search with --solver mcts, the
+        alpha-beta search_move otherwise
+        :rtype: Tuple[State, float]
+    """
+    if solver == "mcts":
+        return mcts_move(s)
+    return search_move(s)
+
+
+def play_game(s):
+    """
+        Play the game from s with the chosen solver, recording every state
+        it reaches, see record
+        :rtype: Tuple[State, float]
+    """
+    if solver == "pns":
+        final_state, v = pn_search_game(s)
+    else:
+        final_state, v = alpha_beta_search(s)
+    if game_writer is not None:
+        game_writer.finish(final_state)
+    return final_state, v
+
+
+def is_capture(path):
+    """
+        Returns if the move along path jumped
+        :type path: Tuple[Tuple(int, int)]
+        :rtype: Boolean
+    """
+    return abs(path[1][0] - path[0][0]) == 2
+
+
+def get_opp_char(cur):
+    if cur == ['b', 'B']:
+        return ['r', 'R']
+    else:
+        return ['b', 'B']
+
+
+def get_next_turn(curr_turn):
+    if curr_turn == 'r':
+        return 'b'
+    else:
+        return 'r'
+
+
+def queen_checker(board):
+    for z in range(len(board[0])):
+        if board[0][z] == 'r':
+            board[0][z] = 'R'
+    for m in range(len(board[7])):
+        if board[7][m] == 'b':
+            board[7][m] = 'B'
+    return board
+
+
+def read_from_file(filename):
+
+    f = open(filename)
+    lines = f.readlines()
+    board = [[str(x) for x in l.rstrip()] for l in lines]
+    f.close()
 
     return board
 
 
+def configure(args):
+    """
+        Set the search settings from the parsed command line
+    """
+    global search_core, move_ordering, time_per_move, max_depth, \
+        incremental_eval, debug_eval, tablebase, batch_eval_leaves, \
+        game_repetitions, search_repetitions, move_limit, quiescence_depth, \
+        solver, pns_max_plies, pns_max_nodes, position_cache, pvs, \
+        mcts_playouts, mcts_batch, mcts_exploration
+    search_core = args.core
+    if args.eval_weights is not None:
+        load_eval_weights(args.eval_weights)
+    move_ordering = args.move_ordering == "on"
+    time_per_move = args.time_per_move
+    if args.max_depth is not None:
+        max_depth = args.max_depth
+    elif time_per_move is not None:
+        max_depth = MAX_SEARCH_DEPTH
+    incremental_eval = args.incremental_eval
+    debug_eval = args.debug_eval
+    if args.tablebase is not None:
+        tablebase = Tablebase(args.tablebase)
+    batch_eval_leaves = args.batch_eval
+    game_repetitions = args.repetition != "off"
+    search_repetitions = args.repetition == "search"
+    move_limit = args.move_limit
+    quiescence_depth = args.quiescence_depth if args.quiescence else 0
+    solver = args.solver
+    pns_max_plies = args.pns_max_plies
+    pns_max_nodes = args.pns_max_nodes
+    mcts_playouts = args.mcts_playouts
+    if mcts_playouts is None and time_per_move is None:
+        mcts_playouts = 1000
+    mcts_batch = args.mcts_batch
+    mcts_exploration = args.mcts_exploration
+    pvs = not args.no_pvs
+    if args.cache is not None:
+        position_cache = PositionCache(args.cache, args.cache_size,
+                                       cache_config())
+
+
+def reset_search(args):
+    """
+        Forget everything the previous puzzle left in the module globals:
+        the walkthrough, the transposition table, the ordering tables and
+        the node count
+    """
+    global transposition_table, nodes_searched, principal_variation, \
+        expected_lines, playouts_run
+    del walkthrough[:]
+    transposition_table = None
+    if args.tt_size > 0:
+        transposition_table = TranspositionTable(args.tt_size, args.tt_policy)
+    for killers in killer_moves:
+        killers[0] = killers[1] = None
+    history_scores.clear()
+    nodes_searched = 0
+    principal_variation = ()
+    expected_lines = {}
+    playouts_run = 0
+
+
+def load_state(filename, backend):
+    """
+        Read the puzzle in filename as a state of the given backend with
+        red to move
+        :rtype: State or BitState
+    """
+    return make_state(read_from_file(filename), player, backend)
+
+
+def make_state(initial_board, turn, backend):
+    """
+        Returns the position of initial_board with turn to move as a state
+        of the given backend
+        :rtype: State or BitState
+    """
+    state = State(initial_board, turn)
+    if backend == "bitboard":
+        try:
+            state = BitState.from_board(initial_board, turn)
+        except ValueError as e:
+            print("bitboard backend unavailable, using list: %s" % e,
+                  file=sys.stderr)
+    if incremental_eval:
+        state.score = state.full_units()
+    return state
+
+
+# PDN result of the game, red playing White's part: red moves up from
+# squares 21-32 like White in the standard numbering
+PDN_RESULTS = {player[0]: "1-0", computer[0]: "0-1", None: "1/2-1/2"}
+
+
+def square_number(x, y):
+    """
+        Returns the standard 1-32 number of the dark square (x, y), black's
+        side of the board holding 1-12
+        :rtype: int
+    """
+    return y * 4 + x // 2 + 1
+
+
+def move_notation(path):
+    """
+        Returns the move along path in standard notation, 11-15 for a slide
+        and 22x15x8 for a jump, every landing square of a multi-jump listed
+        :type path: Tuple[Tuple(int, int)]
+        :rtype: str
+    """
+    return ('x' if is_capture(path) else '-').join(
+        str(square_number(x, y)) for x, y in path)
+
+
+def fen(state):
+    """
+        Returns the position of state as a PDN FEN tag value, e.g.
+        W:W18,K24:B6,10 with red to move, kings marked with K
+        :rtype: str
+    """
+    pieces = {'r': [], 'b': []}
+    for sq, (x, y) in enumerate(SQUARE_XY):
+        char = state.board[y][x]
+        if char != '.':
+            pieces[char.lower()].append(
+                ('K' if char.isupper() else '') + str(sq + 1))
+    return "%s:W%s:B%s" % ('W' if state.cur_turn == player else 'B',
+                           ','.join(pieces['r']), ','.join(pieces['b']))
+
+
+def parse_fen(text):
+    """
+        Returns the board and the side to move of a PDN FEN tag value
+        :rtype: Tuple[List[List[str]], List[str]]
+    """
+    fields = text.strip().rstrip('.').split(':')
+    if len(fields) != 3 or fields[0] not in ('W', 'B'):
+        raise ValueError("bad FEN %r" % text)
+    board = [['.'] * 8 for _ in range(8)]
+    for field in fields[1:]:
+        men = {'W': 'r', 'B': 'b'}.get(field[:1])
+        if men is None:
+            raise ValueError("bad FEN %r" % text)
+        for square in filter(None, field[1:].split(',')):
+            char = men.upper() if square.startswith('K') else men
+            number = int(square.lstrip('K'))
+            if not 1 <= number <= 32:
+                raise ValueError("no square %d in FEN %r" % (number, text))
+            x, y = SQUARE_XY[number - 1]
+            board[y][x] = char
+    return board, player if fields[0] == 'W' else computer
+
+
+def game_result(final_state):
+    """
+        Returns the PDN result of a game that ended on final_state: a win
+        for the other side when the side to move has no move, a draw by the
+        draw rules otherwise
+        :rtype: str
+    """
+    for _ in final_state.iter_moves():
+        return PDN_RESULTS[None]
+    return PDN_RESULTS[get_opp_char(final_state.cur_turn)[0]]
+
+
+class BoardWriter:
+    # Streams the walkthrough in the board format of the puzzles: every
+    # board as soon as the game reaches it, one empty line after each, and
+    # a flush so a game cut short keeps the plies played so far.
+    def __init__(self, f):
+        self.f = f
+        self.plies = -1
+
+    def add(self, state):
+        for row in state.board:
+            self.f.write(''.join(row) + '\n')
+        self.f.write('\n')
+        self.f.flush()
+        self.plies += 1
+
+    def finish(self, final_state):
+        pass
+
+
+class RecordWriter:
+    # Streams the game as a PDN record: the starting position in a FEN tag,
+    # then one move per ply in standard notation, and the result once the
+    # game is over. --replay turns a record back into boards.
+    def __init__(self, f):
+        self.f = f
+        self.plies = -1
+
+    def add(self, state):
+        if self.plies < 0:
+            self.f.write('[FEN "%s"]\n\n' % fen(state))
+            self.number = 1
+        elif state.cur_turn == player:
+            # black moved: black opens each numbered move, as in PDN
+            self.f.write("%d. %s " % (self.number, move_notation(state.move)))
+        else:
+            if self.plies == 0:
+                self.f.write("%d... " % self.number)
+            self.f.write(move_notation(state.move) + ' ')
+            self.number += 1
+        self.f.flush()
+        self.plies += 1
+
+    def finish(self, final_state):
+        self.f.write(game_result(final_state) + '\n')
+        self.f.flush()
+
+
+OUTPUT_FORMATS = {"boards": BoardWriter, "pdn": RecordWriter}
+
+
+def record(state):
+    """
+        Add state to the game being played: write it out straight away when
+        there is a game_writer, or keep it in walkthrough otherwise. The
+        link to its parent is dropped, so the positions of a long game are
+        freed once written.
+    """
+    if state is None:
+        return
+    state.parent = None
+    if game_writer is None:
+        walkthrough.append(state)
+    else:
+        game_writer.add(state)
+
+
+@contextmanager
+def open_game_writer(filename, output_format):
+    """
+        Stream the game played inside the with block to filename in
+        output_format, see OUTPUT_FORMATS
+    """
+    global game_writer
+    with open(filename, 'w') as f:
+        game_writer = OUTPUT_FORMATS[output_format](f)
+        try:
+            yield game_writer
+        finally:
+            game_writer = None
+
+
+def read_record(filename):
+    """
+        Read the PDN record in filename: its starting position, taken from
+        the FEN tag or the standard start, and the squares of each move
+        :rtype: Tuple[List[List[str]], List[str], List[List[int]]]
+    """
+    with open(filename) as f:
+        text = f.read()
+    board, turn = [row[:] for row in Board], computer
+    tags = re.findall(r'\[(\w+)\s+"([^"]*)"\]', text)
+    for name, value in tags:
+        if name == "FEN":
+            board, turn = parse_fen(value)
+    text = re.sub(r'\[[^\]]*\]|\{[^}]*\}', ' ', text)
+    moves = []
+    for token in text.split():
+        if token in PDN_RESULTS.values() or token == '*':
+            break
+        token = re.sub(r'^\d+\.(\.\.)?', '', token)
+        if not token:
+            continue
+        if not re.match(r'^\d+([-x]\d+)+$', token):
+            raise ValueError("bad move %r in %s" % (token, filename))
+        moves.append([int(square) for square in re.split('[-x]', token)])
+    return board, turn, moves
+
+
+def replay(filename, writer):
+    """
+        Play the moves of the PDN record in filename from its starting
+        position, handing every state to writer. A jump may be written with
+        its landing squares or with its two ends only.
+        :rtype: State
+    """
+    board, turn, moves = read_record(filename)
+    s = State(board, turn)
+    writer.add(s)
+    for ply, squares in enumerate(moves, 1):
+        matches = []
+        for move in s.iter_moves():
+            path = [square_number(x, y) for x, y in move.path]
+            if path == squares or (move.captured and len(squares) == 2 and
+                                   [path[0], path[-1]] == squares):
+                matches.append(move)
+        if len(matches) != 1:
+            raise ValueError("%s move %d is %s" % (
+                '-'.join(map(str, squares)), ply,
+                "ambiguous" if matches else "illegal"))
+        s = s.play(matches[0])
+        s.parent = None
+        writer.add(s)
+    return s
+
+
+def list_puzzles(args):
+    """
+        Returns the (input file, output file) pair of every batch puzzle:
+        the files of --inputdir in name order, or the paths listed in
+        --manifest one per line (relative to the manifest, blank lines and
+        lines starting with # skipped). Each solution keeps the puzzle's
+        file name inside --outputdir.
+        :rtype: List[Tuple[str, str]]
+    """
+    if args.manifest is not None:
+        base = os.path.dirname(os.path.abspath(args.manifest))
+        with open(args.manifest) as f:
+            names = [line.strip() for line in f]
+        inputs = [os.path.join(base, name) for name in names
+                  if name and not name.startswith('#')]
+    else:
+        inputs = [os.path.join(args.inputdir, name)
+                  for name in sorted(os.listdir(args.inputdir))
+                  if os.path.isfile(os.path.join(args.inputdir, name))]
+    return [(path, os.path.join(args.outputdir, os.path.basename(path)))
+            for path in inputs]
+
+
+def init_batch_worker(args):
+    """
+        Pool initializer: every worker process keeps its own copy of the
+        module globals, set up once from the command line
+    """
+    global batch_args
+    batch_args = args
+    configure(args)
+
+
+def solve_puzzle(job):
+    """
+        Solve one batch puzzle in the calling worker, streaming its solution
+        to the output file. A puzzle that runs past --puzzle-timeout or
+        fails is reported, its file keeping the plies played until then.
+        :param job: (input file, output file)
+        :return: puzzle name, status, seconds, nodes searched and plies
+        :rtype: Tuple[str, str, float, int, int]
+    """
+    global puzzle_deadline
+    inputfile, outputfile = job
+    reset_search(batch_args)
+    start = time.time()
+    puzzle_deadline = None
+    if batch_args.puzzle_timeout is not None:
+        puzzle_deadline = start + batch_args.puzzle_timeout
+    status = "solved"
+    writer = None
+    try:
+        # a puzzle that cannot be loaded leaves no solution file behind
+        state = load_state(inputfile, batch_args.backend)
+        with open_game_writer(outputfile,
+                              batch_args.output_format) as writer:
+            play_game(state)
+        save_cache()
+    except PuzzleTimeout:
+        status = "timeout"
+    except Exception as e:
+        status = "error: %s" % e
+    finally:
+        puzzle_deadline = None
+    plies = writer.plies if writer is not None else 0
+    return (os.path.basename(inputfile), status, time.time() - start,
+            nodes_searched, max(plies, 0))
+
+
+def run_batch(args):
+    """
+        Solve every puzzle of the batch across args.jobs worker processes
+        and print one report line per puzzle, in puzzle order, followed by
+        the totals
+        :return: the number of puzzles not solved
+        :rtype: int
+    """
+    jobs = list_puzzles(args)
+    if not os.path.isdir(args.outputdir):
+        os.makedirs(args.outputdir)
+    print("%-24s %-10s %9s %12s %6s" % ("puzzle", "status", "seconds",
+                                        "nodes", "plies"))
+    if args.jobs > 1:
+        pool = multiprocessing.Pool(args.jobs, init_batch_worker, (args,))
+        results = pool.imap(solve_puzzle, jobs)
+    else:
+        pool = None
+        init_batch_worker(args)
+        results = map(solve_puzzle, jobs)
+    start = time.time()
+    failed = 0
+    total_nodes = 0
+    for name, status, seconds, nodes, plies in results:
+        print("%-24s %-10s %9.3f %12d %6d" % (name, status, seconds, nodes,
+                                              plies))
+        sys.stdout.flush()
+        failed += status != "solved"
+        total_nodes += nodes
+    if pool is not None:
+        pool.close()
+        pool.join()
+    print("%d puzzles, %d solved, %d nodes in %.3f seconds with %d jobs"
+          % (len(jobs), len(jobs) - failed, total_nodes, time.time() - start,
+             args.jobs))
+    return failed
+
+
+class ServerRequest:
+    # One search request of --serve and its cancellation state. A request
+    # is cancelled before it starts by skipping it, and while it runs by
+    # moving puzzle_deadline into the past, so the search stops at its next
+    # deadline check exactly as a timed out batch puzzle does.
+
+    def __init__(self, request, state=None):
+        self.request = request
+        self.id = request.get("id")
+        self.cancelled = False
+        # the position to ponder: given for a ponder search, set by a move
+        # search to the position after the reply it expects
+        self.state = state
+
+
+class EngineServer:
+    # --serve: a long-lived engine answering search requests, one JSON
+    # object per line, on stdin/stdout or on the connections of a Unix
+    # socket. The module globals hold one search at a time, so searches run
+    # in turn on a single worker thread while the event loop keeps reading;
+    # that is what lets a cancel request reach a running search. The
+    # transposition table, ordering tables and position cache are kept
+    # between requests, so later requests start warm. With --ponder the
+    # worker searches on while the client thinks about its reply, from the
+    # position the reply it expects leads to, until the next request comes.
+    # per-request settings and the module globals they override
+    OPTIONS = ("max_depth", "time_per_move")
+
+    def __init__(self, args):
+        """
+            :param args: the parsed command line, for the search settings
+            :type args: argparse.Namespace
+        """
+        self.args = args
+        self.executor = ThreadPoolExecutor(1)
+        self.lock = threading.Lock()
+        self.current = None
+        self.pondering = None
+        self.queued = 0
+
+    def serve_stdio(self):
+        """
+            Answer the requests read from stdin on stdout until stdin closes
+        """
+        async def run():
+            loop = asyncio.get_running_loop()
+            reader = asyncio.StreamReader()
+            await loop.connect_read_pipe(
+                lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+            await self.handle(reader, StdoutWriter())
+        asyncio.run(run())
+
+    def serve_socket(self, path):
+        """
+            Answer the requests of every connection to the Unix socket at
+            path, until interrupted
+        """
+        async def run():
+            if os.path.exists(path):
+                os.unlink(path)
+            server = await asyncio.start_unix_server(self.handle, path)
+            async with server:
+                await server.serve_forever()
+        try:
+            asyncio.run(run())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+    async def handle(self, reader, writer):
+        """
+            Read the requests of one client and write each answer as soon as
+            its search is done. {"cancel": id} cancels the request of that
+            id. Once the client stops sending, the requests it made are
+            still answered.
+        """
+        requests = {}
+        answers = []
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("a request is a JSON object")
+                for field in ("id", "cancel"):
+                    if not isinstance(request.get(field),
+                                      (str, int, float, type(None))):
+                        raise ValueError("%s must be a string or a number"
+                                         % field)
+            except ValueError as e:
+                self.send(writer, {"status": "error",
+                                   "error": "bad request: %s" % e})
+                continue
+            if "cancel" in request:
+                if request["cancel"] in requests:
+                    self.cancel(requests[request["cancel"]])
+                continue
+            self.stop_pondering()
+            job = ServerRequest(request)
+            requests[job.id] = job
+            self.queued += 1
+            answers.append(asyncio.ensure_future(
+                self.answer(job, writer, requests)))
+        if answers:
+            await asyncio.gather(*answers)
+        self.stop_pondering()
+        writer.close()
+
+    async def answer(self, job, writer, requests):
+        """
+            Search job on the worker thread and send its answer
+        """
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(self.executor, self.search, job)
+        if requests.get(job.id) is job:
+            del requests[job.id]
+        self.queued -= 1
+        self.send(writer, response)
+        if self.args.ponder and not self.queued and job.state is not None:
+            self.pondering = ServerRequest(job.request, job.state)
+            loop.run_in_executor(self.executor, self.ponder,
+                                 self.pondering).add_done_callback(
+                self.ponder_done)
+
+    def ponder_done(self, future):
+        """
+            Report the error a ponder search stopped on. Pondering answers
+            no request, so it goes to stderr.
+        """
+        if not future.cancelled() and future.exception() is not None:
+            print("ponder search failed: %s" % future.exception(),
+                  file=sys.stderr)
+
+    def stop_pondering(self):
+        """
+            Stop the ponder search, if one is running or about to
+        """
+        if self.pondering is not None:
+            self.cancel(self.pondering)
+            self.pondering = None
+
+    def send(self, writer, response):
+        """
+            Write response as one line of JSON
+        """
+        try:
+            writer.write((json.dumps(response) + "\n").encode())
+        except (ConnectionError, RuntimeError):
+            pass
+
+    def cancel(self, job):
+        """
+            Stop job: skip it if it has not started, or stop its search
+        """
+        global puzzle_deadline
+        with self.lock:
+            job.cancelled = True
+            if self.current is job:
+                puzzle_deadline = 0
+
+    def search(self, job):
+        """
+            Run the search of one request on the worker thread. The request
+            holds the board as rows of 8 characters, "turn" ("r" or "b",
+            default "r"), "mode" ("move" for the best move, "game" for the
+            whole walkthrough, default "move"), "time_limit" in seconds for
+            the whole request, and the search settings of OPTIONS; any other
+            setting is the one the server was started with. A request with
+            a time_per_move but no max_depth searches as deep as the clock
+            allows, unless the server was started with --max-depth.
+            :return: the answer to send back
+            :rtype: Dict
+        """
+        global puzzle_deadline, nodes_searched, max_depth
+        request = job.request
+        response = {"id": job.id}
+        start = time.time()
+        saved = {name: globals()[name] for name in self.OPTIONS}
+        with self.lock:
+            if job.cancelled:
+                response["status"] = "cancelled"
+                return response
+            self.current = job
+            puzzle_deadline = None
+        del walkthrough[:]
+        repetition_keys.clear()
+        nodes_searched = 0
+        try:
+            board, turn, mode, time_limit, options = parse_request(request)
+            with self.lock:
+                if job.cancelled:
+                    raise PuzzleTimeout()
+                if time_limit is not None:
+                    puzzle_deadline = start + time_limit
+            globals().update(options)
+            if options.get("time_per_move") is not None and \
+                    "max_depth" not in options and \
+                    self.args.max_depth is None:
+                max_depth = MAX_SEARCH_DEPTH
+            s = make_state(board, turn, self.args.backend)
+            if mode == "move":
+                next_state, v = choose_move(s)
+                response["move"] = list(map(list, next_state.move)) \
+                    if next_state is not None else None
+                response["board"] = [''.join(row)
+                                     for row in next_state.board] \
+                    if next_state is not None else None
+                if len(principal_variation) > 1:
+                    job.state = next_state.play(principal_variation[1])
+            else:
+                final_state, v = play_game(s)
+                response["walkthrough"] = [
+                    [''.join(row) for row in state.board]
+                    for state in walkthrough if state is not None]
+            response["value"] = json_number(v)
+            response["status"] = "ok"
+            save_cache()
+        except PuzzleTimeout:
+            response["status"] = "cancelled" if job.cancelled else "timeout"
+        except Exception as e:
+            response["status"] = "error"
+            response["error"] = str(e)
+        finally:
+            with self.lock:
+                self.current = None
+                puzzle_deadline = None
+            globals().update(saved)
+        response["nodes"] = nodes_searched
+        response["seconds"] = time.time() - start
+        return response
+
+    def ponder(self, job):
+        """
+            Search job.state on the worker thread until stop_pondering, with
+            the settings of the request that predicted it but no clock. What
+            it finds stays in the transposition table, for the search of the
+            position if the client does play the expected reply.
+        """
+        global puzzle_deadline, max_depth, time_per_move, expected_lines
+        saved = {name: globals()[name] for name in self.OPTIONS}
+        with self.lock:
+            if job.cancelled:
+                return
+            self.current = job
+            puzzle_deadline = None
+        try:
+            for name in self.OPTIONS:
+                if name in job.request:
+                    globals()[name] = job.request[name]
+            if time_per_move is not None:
+                max_depth = MAX_SEARCH_DEPTH
+                time_per_move = None
+            repetition_keys.clear()
+            search_move(job.state)
+        except PuzzleTimeout:
+            pass
+        finally:
+            with self.lock:
+                self.current = None
+                puzzle_deadline = None
+            globals().update(saved)
+        # the search of job.state starts where pondering got to
+        expected_lines = {job.state.key: (0, principal_variation)}
+
+
+class StdoutWriter:
+    # The writer of the stdin/stdout client: the half of a StreamWriter
+    # EngineServer.handle uses, over sys.stdout.
+
+    def write(self, data):
+        sys.stdout.write(data.decode())
+        sys.stdout.flush()
+
+    def close(self):
+        pass
+
+
+def is_number(value):
+    """
+        Returns if value is a JSON number, true and false left out
+        :rtype: Boolean
+    """
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def parse_request(request):
+    """
+        Returns the board, side to move, mode, time limit and
+        EngineServer.OPTIONS settings of a server request, every field
+        checked before the search starts
+        :rtype: Tuple[List[List[str]], List[str], str, float, Dict]
+        :raises ValueError: if a field has the wrong type or value
+    """
+    board = parse_board(request.get("board"))
+    turn = request.get("turn", "r")
+    if turn not in ("r", "b"):
+        raise ValueError('turn must be "r" or "b"')
+    mode = request.get("mode", "move")
+    if mode not in ("move", "game"):
+        raise ValueError("unknown mode %r" % (mode,))
+    time_limit = request.get("time_limit")
+    if time_limit is not None and \
+            (not is_number(time_limit) or time_limit < 0):
+        raise ValueError("time_limit must be a number of seconds")
+    options = {}
+    if "max_depth" in request:
+        options["max_depth"] = request["max_depth"]
+        if not isinstance(options["max_depth"], int) or \
+                isinstance(options["max_depth"], bool) or \
+                not 1 <= options["max_depth"] <= MAX_SEARCH_DEPTH:
+            raise ValueError("max_depth must be a whole number from 1 to %d"
+                             % MAX_SEARCH_DEPTH)
+    if "time_per_move" in request:
+        options["time_per_move"] = request["time_per_move"]
+        if options["time_per_move"] is not None and \
+                (not is_number(options["time_per_move"]) or
+                 options["time_per_move"] <= 0):
+            raise ValueError("time_per_move must be a positive number of "
+                             "seconds")
+    return board, player if turn == "r" else computer, mode, time_limit, \
+        options
+
+
+def parse_board(rows):
+    """
+        Returns the board of a server request, given as 8 strings of 8
+        characters from ".rRbB"
+        :rtype: List[List[str]]
+        :raises ValueError: if rows is not such a board
+    """
+    if not isinstance(rows, list) or len(rows) != 8 or \
+            not all(isinstance(row, str) and len(row) == 8 and
+                    set(row) <= set(".rRbB") for row in rows):
+        raise ValueError("board must be 8 rows of 8 characters from .rRbB")
+    return [list(row) for row in rows]
+
+
 if __name__ == '__main__':
     # board_final2 = [
     #     ['.', '.', '.', '.', 'a'],
@@ -607,33 +4200,361 @@ if __name__ == '__main__':
     parser.add_argument(
         "--inputfile",
         type=str,
-        required=True,
         help="The input file that contains the puzzles."
     )
     parser.add_argument(
         "--outputfile",
         type=str,
-        required=True,
         help="The output file that contains the solution."
     )
+    parser.add_argument(
+        "--output-format",
+        choices=sorted(OUTPUT_FORMATS),
+        default="boards",
+        help="Write the solution as boards, or as a PDN record of the moves "
+             "in standard notation."
+    )
+    parser.add_argument(
+        "--replay",
+        type=str,
+        default=None,
+        help="Play the moves of this PDN record and write the game to "
+             "--outputfile in --output-format, without searching."
+    )
+    parser.add_argument(
+        "--inputdir",
+        type=str,
+        help="Batch mode: solve every puzzle file in this directory."
+    )
+    parser.add_argument(
+        "--manifest",
+        type=str,
+        help="Batch mode: solve the puzzle files listed in this file."
+    )
+    parser.add_argument(
+        "--outputdir",
+        type=str,
+        help="Batch mode: directory the solutions are written to."
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Batch mode: number of worker processes."
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Run as an engine server answering JSON-lines search requests "
+             "on stdin/stdout."
+    )
+    parser.add_argument(
+        "--socket",
+        type=str,
+        default=None,
+        help="With --serve, listen on this Unix socket instead of stdin."
+    )
+    parser.add_argument(
+        "--ponder",
+        action="store_true",
+        help="With --serve, search the position the expected reply leads to "
+             "while waiting for the next request."
+    )
+    parser.add_argument(
+        "--tablebase",
+        type=str,
+        default=None,
+        help="Endgame tablebase file written by tablebase.py, probed during "
+             "the search."
+    )
+    parser.add_argument(
+        "--stats-json",
+        type=str,
+        default=None,
+        help="Write node counts, cutoffs, evaluations, transposition table "
+             "probes and timings per move and per game to this file."
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="Split the root moves of deeper iterations across this many "
+             "processes and report the search speed."
+    )
+    parser.add_argument(
+        "--puzzle-timeout",
+        type=float,
+        default=None,
+        help="Batch mode: give up on a puzzle after this many seconds."
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["list", "bitboard"],
+        default="list",
+        help="Board representation used by the move generator."
+    )
+    parser.add_argument(
+        "--tt-size",
+        type=float,
+        default=16,
+        help="Memory cap of the transposition table in megabytes, 0 turns "
+             "it off."
+    )
+    parser.add_argument(
+        "--tt-policy",
+        choices=["depth", "always"],
+        default="depth",
+        help="Replacement policy of the transposition table."
+    )
+    parser.add_argument(
+        "--time-per-move",
+        type=float,
+        default=None,
+        help="Wall-clock budget in seconds for each move, searched by "
+             "iterative deepening."
+    )
+    parser.add_argument(
+        "--max-depth",
+        type=int,
+        default=None,
+        help="Deepest iteration of iterative deepening (default 1, or %d "
+             "with --time-per-move)." % MAX_SEARCH_DEPTH
+    )
+    parser.add_argument(
+        "--move-ordering",
+        choices=["on", "off"],
+        default="off",
+        help="Search captures, promotions, killer and history moves first."
+    )
+    parser.add_argument(
+        "--no-pvs",
+        action="store_true",
+        help="Search every move with the full alpha-beta window, without "
+             "null windows or aspiration windows."
+    )
+    parser.add_argument(
+        "--eval-weights",
+        type=str,
+        default=None,
+        help="JSON file of eval() weights, as written by tune.py."
+    )
+    parser.add_argument(
+        "--incremental-eval",
+        action="store_true",
+        help="Keep each state's score up to date from its parent's instead "
+             "of rescoring the whole board."
+    )
+    parser.add_argument(
+        "--debug-eval",
+        action="store_true",
+        help="With --incremental-eval, assert every running score matches a "
+             "full rescore."
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default=None,
+        help="SQLite file of search results kept between runs."
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=200000,
+        help="Most positions the --cache file keeps."
+    )
+    parser.add_argument(
+        "--solver", "--engine",
+        choices=["alphabeta", "pns", "mcts"],
+        default="alphabeta",
+        help="alphabeta plays the game move by move, pns proves the "
+             "shortest forced win with proof-number search, mcts plays move "
+             "by move with Monte Carlo tree search."
+    )
+    parser.add_argument(
+        "--mcts-playouts",
+        type=int,
+        default=None,
+        help="Playouts per move of --solver mcts (default 1000, or as many "
+             "as --time-per-move allows)."
+    )
+    parser.add_argument(
+        "--mcts-batch",
+        type=int,
+        default=8,
+        help="Leaves --solver mcts plays out together, shared out across "
+             "the --threads workers."
+    )
+    parser.add_argument(
+        "--mcts-exploration",
+        type=float,
+        default=1.4,
+        help="UCT exploration constant of --solver mcts."
+    )
+    parser.add_argument(
+        "--pns-max-plies",
+        type=int,
+        default=41,
+        help="With --solver pns, the longest win to look for."
+    )
+    parser.add_argument(
+        "--pns-max-nodes",
+        type=int,
+        default=1000000,
+        help="With --solver pns, the most nodes a proof tree may hold."
+    )
+    parser.add_argument(
+        "--quiescence",
+        action="store_true",
+        help="Keep searching past the nominal depth while the side to move "
+             "has a jump to make."
+    )
+    parser.add_argument(
+        "--quiescence-depth",
+        type=int,
+        default=16,
+        help="With --quiescence, the most plies a line is extended by."
+    )
+    parser.add_argument(
+        "--repetition",
+        choices=["off", "game", "search"],
+        default="game",
+        help="game ends the game drawn when a position occurs for the "
+             "third time, search also scores repeated positions in the "
+             "search as draws."
+    )
+    parser.add_argument(
+        "--move-limit",
+        type=int,
+        default=80,
+        help="End the game drawn after this many plies in a row without a "
+             "capture, 0 for no limit."
+    )
+    parser.add_argument(
+        "--batch-eval",
+        action="store_true",
+        help="Score all the leaf children of a node together with numpy."
+    )
+    parser.add_argument(
+        "--core",
+        choices=["copy", "inplace"],
+        default="copy",
+        help="Search core: copy builds a successor state per node, inplace "
+             "plays and takes back moves on a single board."
+    )
     args = parser.parse_args()
+    if args.batch_eval and np is None:
+        parser.error("--batch-eval needs numpy")
+    if args.batch_eval and args.incremental_eval:
+        parser.error("--batch-eval scores whole boards, it cannot be "
+                     "combined with --incremental-eval")
+    if args.threads is not None and args.threads < 1:
+        parser.error("--threads must be at least 1")
+    if args.eval_weights is not None:
+        try:
+            load_eval_weights(args.eval_weights)
+        except (OSError, ValueError) as e:
+            parser.error("cannot load --eval-weights: %s" % e)
+    if args.cache is not None and args.repetition == "search":
+        parser.error("--cache cannot be combined with --repetition search, "
+                     "whose scores depend on the game played so far")
+    if args.mcts_batch < 1 or (args.mcts_playouts is not None and
+                               args.mcts_playouts < 1):
+        parser.error("--mcts-playouts and --mcts-batch must be at least 1")
+    if args.quiescence and not 0 < args.quiescence_depth <= MAX_PLY // 2:
+        parser.error("--quiescence-depth must be between 1 and %d"
+                     % (MAX_PLY // 2))
+    # the search and its quiescence extension together reach MAX_PLY plies
+    deepest = MAX_PLY - (args.quiescence_depth if args.quiescence else 0)
+    if args.max_depth is not None and not 1 <= args.max_depth <= deepest:
+        parser.error("--max-depth must be between 1 and %d" % deepest)
+    if args.threads is not None and args.threads > 1:
+        search_pool = multiprocessing.Pool(args.threads, init_search_worker,
+                                           (args,))
+    batch = args.inputdir is not None or args.manifest is not None
+    if args.socket is not None and not args.serve:
+        parser.error("--socket needs --serve")
+    if args.ponder and not args.serve:
+        parser.error("--ponder needs --serve")
+    if args.serve:
+        if batch or args.inputfile is not None or \
+                args.outputfile is not None:
+            parser.error("--serve takes its positions from requests, not "
+                         "from files")
+        if args.stats_json is not None:
+            parser.error("--stats-json cannot be combined with --serve")
+        configure(args)
+        reset_search(args)
+        server = EngineServer(args)
+        if args.socket is not None:
+            server.serve_socket(args.socket)
+        else:
+            server.serve_stdio()
+        sys.exit(0)
+    if args.replay is not None:
+        if batch or args.inputfile is not None or args.outputfile is None:
+            parser.error("--replay needs --outputfile and no puzzle")
+        try:
+            with open_game_writer(args.outputfile,
+                                  args.output_format) as writer:
+                writer.finish(replay(args.replay, writer))
+        except (OSError, ValueError) as e:
+            print("cannot replay %s: %s" % (args.replay, e), file=sys.stderr)
+            sys.exit(1)
+        sys.exit(0)
+    if batch:
+        if args.inputfile is not None or args.outputfile is not None:
+            parser.error("--inputfile/--outputfile cannot be combined with "
+                         "--inputdir/--manifest")
+        if args.inputdir is not None and args.manifest is not None:
+            parser.error("give either --inputdir or --manifest")
+        if args.outputdir is None:
+            parser.error("batch mode needs --outputdir")
+        if args.jobs < 1:
+            parser.error("--jobs must be at least 1")
+        if args.jobs > 1 and args.threads is not None and args.threads > 1:
+            parser.error("--threads cannot be combined with --jobs")
+        if args.stats_json is not None:
+            parser.error("--stats-json needs --inputfile")
+        sys.exit(1 if run_batch(args) else 0)
+    if args.inputfile is None or args.outputfile is None:
+        parser.error("--inputfile and --outputfile are required")
+    configure(args)
+    reset_search(args)
+    if args.stats_json is not None:
+        search_stats = SearchStats()
 
-    initial_board = read_from_file(args.inputfile)
-    state = State(initial_board, player)
+    state = load_state(args.inputfile, args.backend)
     turn = 'r'
     ctr = 0
 
-    sys.stdout = open(args.outputfile, 'w')
-
-    sys.stdout = sys.__stdout__
-
-    # write output into txt file.
-    final_state, score = alpha_beta_search(state)
-    # print board of each state in walkthrough list
-    with open(args.outputfile, 'w') as f:
-        for i, state in enumerate(walkthrough):
-            for row in state.board:
-                f.write(''.join(row) + '\n')
-            f.write('\n')
+    # write output into txt file as the game goes.
+    start = time.time()
+    with open_game_writer(args.outputfile, args.output_format):
+        final_state, score = play_game(state)
+    if args.threads is not None:
+        elapsed = time.time() - start
+        print("%d nodes in %.3f seconds (%.0f nodes/s) with %d threads"
+              % (nodes_searched, elapsed, nodes_searched / max(elapsed, 1e-9),
+                 args.threads), file=sys.stderr)
+    if solver == "mcts":
+        elapsed = time.time() - start
+        print("%d playouts in %.3f seconds (%.0f playouts/s, %.0f nodes/s)"
+              % (playouts_run, elapsed, playouts_run / max(elapsed, 1e-9),
+                 nodes_searched / max(elapsed, 1e-9)), file=sys.stderr)
+    save_cache()
+    if search_stats is not None:
+        search_stats.write(args.stats_json)
+    if search_pool is not None:
+        # the speedup is in time to the same depth, or in nodes per second
+        # when the clock sets the depth
+        threaded_nodes, threaded_elapsed = nodes_searched, elapsed
+        nodes, elapsed = time_sequential(args)
+        speedup = elapsed / max(threaded_elapsed, 1e-9) \
+            if time_per_move is None else \
+            threaded_nodes * elapsed / max(nodes * threaded_elapsed, 1e-9)
+        print("%d nodes in %.3f seconds (%.0f nodes/s) with 1 thread, "
+              "speedup %.2f with %d threads"
+              % (nodes, elapsed, nodes / max(elapsed, 1e-9), speedup,
+                 args.threads), file=sys.stderr)
 
 
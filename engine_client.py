@@ -0,0 +1,160 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+# Local client of the engine server (checkers.py --serve). Each puzzle file
+# becomes one request, named after the file, and every answer is printed as
+# it arrives. Without --socket the client starts its own server over a pipe,
+# so it doubles as a test of the server and of keeping it warm: requests
+# after the first reuse its transposition table.
+
+CHECKERS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'checkers.py')
+
+
+def make_request(filename, args):
+    """
+        Returns the request asking for the puzzle in filename
+        :rtype: Dict
+    """
+    with open(filename) as f:
+        board = [line.rstrip() for line in f if line.strip()]
+    request = {"id": os.path.basename(filename), "board": board,
+               "turn": args.turn, "mode": args.mode}
+    if args.max_depth is not None:
+        request["max_depth"] = args.max_depth
+    if args.time_per_move is not None:
+        request["time_per_move"] = args.time_per_move
+    if args.time_limit is not None:
+        request["time_limit"] = args.time_limit
+    return request
+
+
+async def connect(args):
+    """
+        Returns the reader and writer of the server: the Unix socket of
+        --socket, or the pipes of a server started here
+        :rtype: Tuple[asyncio.StreamReader, asyncio.StreamWriter, Process]
+    """
+    if args.socket is not None:
+        reader, writer = await asyncio.open_unix_connection(args.socket)
+        return reader, writer, None
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, CHECKERS, '--serve', *args.server_arg,
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+    return process.stdout, process.stdin, process
+
+
+async def run(args):
+    """
+        Send every request, cancel those still running after --cancel-after
+        seconds, and print the answers
+        :return: the number of answers that are not "ok"
+        :rtype: int
+    """
+    reader, writer, process = await connect(args)
+    requests = [make_request(filename, args) for filename in args.puzzles]
+    start = time.time()
+    for request in requests:
+        writer.write((json.dumps(request) + "\n").encode())
+    await writer.drain()
+    pending = {request["id"] for request in requests}
+    if args.cancel_after is not None:
+        async def cancel():
+            await asyncio.sleep(args.cancel_after)
+            for request_id in sorted(pending):
+                writer.write((json.dumps({"cancel": request_id}) +
+                              "\n").encode())
+            await writer.drain()
+        asyncio.ensure_future(cancel())
+    failed = 0
+    while pending:
+        line = await reader.readline()
+        if not line:
+            print("server closed the connection", file=sys.stderr)
+            return failed + len(pending)
+        response = json.loads(line)
+        pending.discard(response.get("id"))
+        failed += response.get("status") != "ok"
+        if args.verbose:
+            print(json.dumps(response))
+        else:
+            print("%-24s %-10s %9.3f %12d %10s %8.3f"
+                  % (response.get("id"), response.get("status"),
+                     response.get("seconds", 0), response.get("nodes", 0),
+                     response.get("value"), time.time() - start))
+        sys.stdout.flush()
+    writer.close()
+    if process is not None:
+        await process.wait()
+    return failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "puzzles",
+        nargs="+",
+        help="Puzzle files to send, one request each."
+    )
+    parser.add_argument(
+        "--socket",
+        type=str,
+        default=None,
+        help="Unix socket of a running server (default: start one)."
+    )
+    parser.add_argument(
+        "--server-arg",
+        action="append",
+        default=[],
+        help="Command line argument of the server started here, e.g. "
+             "--server-arg=--tt-size=64. Can be given more than once."
+    )
+    parser.add_argument(
+        "--mode",
+        choices=["move", "game"],
+        default="game",
+        help="Ask for the best move or for the whole walkthrough."
+    )
+    parser.add_argument(
+        "--turn",
+        choices=["r", "b"],
+        default="r",
+        help="Side to move in the puzzles."
+    )
+    parser.add_argument(
+        "--max-depth",
+        type=int,
+        default=None,
+        help="Search depth of each request."
+    )
+    parser.add_argument(
+        "--time-per-move",
+        type=float,
+        default=None,
+        help="Iterative deepening budget of each move, in seconds."
+    )
+    parser.add_argument(
+        "--time-limit",
+        type=float,
+        default=None,
+        help="Time limit of each request, in seconds."
+    )
+    parser.add_argument(
+        "--cancel-after",
+        type=float,
+        default=None,
+        help="Cancel the requests still unanswered after this many seconds."
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Print every answer in full."
+    )
+    args = parser.parse_args()
+    print("%-24s %-10s %9s %12s %10s %8s" % ("request", "status", "seconds",
+                                             "nodes", "value", "elapsed"))
+    sys.exit(1 if asyncio.run(run(args)) else 0)
@@ -0,0 +1,333 @@
+import argparse
+import hashlib
+import importlib
+import sys
+import time
+
+from checkers import BitState, Board, Position, State, Tablebase, \
+    computer, player
+
+# Move generator test: perft(s, depth) counts the positions reached by
+# every sequence of depth moves from s. Counts for the reference positions
+# are fixed, so a generator that drops or invents a slide, jump, multi-jump
+# or promotion gives a wrong count, and timing the walk measures how fast
+# moves are generated and played.
+
+# name, board rows, side to move, leaf counts for depth 1, 2, 3...
+REFERENCE_POSITIONS = [
+    # the published perft numbers of the starting position
+    ('start', [''.join(row) for row in Board], 'r',
+     [7, 49, 302, 1469, 7361, 36768, 179740, 845931]),
+    # the red king can take all four men going round either way and ends
+    # on the square it started from
+    ('king-loop', ['........',
+                   '........',
+                   '........',
+                   '..b.b...',
+                   '.R......',
+                   '..b.b...',
+                   '........',
+                   '......B.'], 'r',
+     [2, 4, 16, 48, 144, 412, 1616, 4954]),
+    # both sides crown by jumping; the new red king has a second jump back
+    # but its move ends on the king row
+    ('promotion', ['........',
+                   '..b.b...',
+                   '.....r..',
+                   '........',
+                   '........',
+                   'b.......',
+                   '.r......',
+                   '........'], 'r',
+     [1, 1, 1, 2, 8, 32, 96, 229]),
+    # lines where red takes black's last piece with five of its own left,
+    # which --tablebase has to score as a win on every backend
+    ('wipe-out', ['........',
+                  '........',
+                  '...b....',
+                  '..b.....',
+                  '.r.r....',
+                  '........',
+                  '.r.r.r..',
+                  'r.......'], 'r',
+     [1, 2, 11, 20, 124, 192, 488, 437]),
+    # red kings on squares whose score_board1 terms are not exact binary
+    # fractions, so every eval() below it depends on how they are summed
+    ('kings', ['.b...R..',
+               'R...R.b.',
+               '.......b',
+               '........',
+               '.....r.b',
+               'r...B.B.',
+               '........',
+               '....R...'], 'r',
+     [9, 29, 169, 865, 4783, 28645, 172306, 1080824]),
+    # the example puzzle of the README
+    ('readme', ['........',
+                '....b...',
+                '.......R',
+                '..b.b...',
+                '...b...r',
+                '........',
+                '...r....',
+                '....B...'], 'r',
+     [5, 5, 16, 106, 337, 2339, 7143, 53067]),
+]
+
+
+# For each reference position, a digest of the eval() values of the
+# positions 1, 2, 3... moves away under the built-in weights, as the
+# hard-coded evaluator of the original engine scored them
+EVAL_DIGESTS = {
+    'start': ['12f638e7ff6b', '0baa85f126a3', 'c159c5f83d46',
+              '3e627fd20b98', '768c562d512a'],
+    'king-loop': ['148120fcc11a', 'adf1664f6ab3', '42ef82a61da2',
+                  'c8e523c03fae', '94936a4fbeb2'],
+    'promotion': ['5f66ffa0d783', 'd61bc5b5d0d2', '95f547a31190',
+                  '0c30fa4f6e09', 'a5629e5a8505'],
+    'wipe-out': ['adaf2f0705e4', 'd62df0dc08f3', '14f5fbb28447',
+                 '331c96801b2b', '7d8515434d8a'],
+    'kings': ['ca9c78f1c784', 'e51d757dd47a', 'd0fa848909df',
+              '047f729901eb', '970a2c437721'],
+    'readme': ['ccc022ace233', 'c9ac11dcd32d', 'e465e01db064',
+               'eeda90a711e4', '317c392bbee9'],
+}
+
+
+class SuccessorWalk:
+    # Expands a State through generate_successor, which builds the list of
+    # all successor states at once, rather than playing one move at a
+    # time. The successors stand in for the moves, so perft and
+    # tablebase_walk run on it unchanged.
+    def __init__(self, state):
+        self.state = state
+
+    def __getattr__(self, name):
+        return getattr(self.state, name)
+
+    def iter_moves(self):
+        return self.state.generate_successor()
+
+    def play(self, successor):
+        return SuccessorWalk(successor)
+
+    def unplay(self, successor):
+        pass
+
+
+BACKENDS = {
+    'list': State,
+    'list-successors': lambda board, turn: SuccessorWalk(State(board, turn)),
+    'bitboard': BitState.from_board,
+    'inplace': Position,
+}
+
+
+def perft(s, depth):
+    """
+        Returns the number of positions depth moves after s
+        :param s: any state with iter_moves, play and unplay
+        :type depth: int
+        :rtype: int
+    """
+    if depth == 0:
+        return 1
+    nodes = 0
+    for move in s.iter_moves():
+        successor = s.play(move)
+        nodes += perft(successor, depth - 1)
+        s.unplay(move)
+    return nodes
+
+
+def tablebase_walk(s, depth, table):
+    """
+        Returns how many of the positions depth moves after s the
+        tablebase settles, and the sum of their values
+        :param s: any state with iter_moves, play and unplay
+        :type table: Tablebase
+        :rtype: Tuple[int, float]
+    """
+    if depth == 0:
+        value = table.probe(s)
+        return (0, 0) if value is None else (1, value)
+    hits, total = 0, 0
+    for move in s.iter_moves():
+        successor = s.play(move)
+        child_hits, child_total = tablebase_walk(successor, depth - 1, table)
+        hits += child_hits
+        total += child_total
+        s.unplay(move)
+    return hits, total
+
+
+def eval_values(s, depth, values):
+    """
+        Append eval() of every position depth moves after s to values
+        :param s: any state with iter_moves, play and unplay
+        :type values: List[float]
+    """
+    if depth == 0:
+        values.append(s.eval())
+        return
+    for move in s.iter_moves():
+        successor = s.play(move)
+        eval_values(successor, depth - 1, values)
+        s.unplay(move)
+
+
+def eval_digest(values):
+    """
+        Returns the EVAL_DIGESTS digest of eval() values: every float
+        written out exactly, in sorted order so it does not depend on the
+        order moves are generated in
+        :rtype: str
+    """
+    text = '\n'.join(sorted(repr(value) for value in values))
+    return hashlib.sha1(text.encode()).hexdigest()[:12]
+
+
+def load_backend(name):
+    """
+        Returns the factory building a state from a board and the side to
+        move: one of BACKENDS, or 'module:function' for a move generator
+        kept outside checkers.py
+        :rtype: Callable
+    """
+    if name in BACKENDS:
+        return BACKENDS[name]
+    module, sep, function = name.partition(':')
+    if not sep:
+        raise ValueError("unknown backend %r" % name)
+    return getattr(importlib.import_module(module), function)
+
+
+def run(backend, positions, depth):
+    """
+        Run perft on each position to each depth up to depth, printing the
+        count, the expected count, the time and the speed
+        :return: the number of wrong counts
+        :rtype: int
+    """
+    factory = load_backend(backend)
+    failed = 0
+    for name, rows, turn, expected in positions:
+        for d in range(1, min(depth, len(expected)) + 1):
+            s = factory([list(row) for row in rows],
+                        player if turn == 'r' else computer)
+            start = time.time()
+            nodes = perft(s, d)
+            elapsed = time.time() - start
+            status = "ok" if nodes == expected[d - 1] else "WRONG"
+            failed += status != "ok"
+            print("%-15s %-10s %2d %10d %10d %-5s %8.3f %10.0f"
+                  % (backend, name, d, nodes, expected[d - 1], status,
+                     elapsed, nodes / max(elapsed, 1e-9)))
+    return failed
+
+
+def check_tablebase(backends, positions, depth, table):
+    """
+        Probe table at every position perft reaches with each backend,
+        printing how many it settles and the sum of their values. Every
+        backend has to agree with the first one.
+        :return: the number of disagreements
+        :rtype: int
+    """
+    failed = 0
+    for name, rows, turn, expected in positions:
+        for d in range(1, min(depth, len(expected)) + 1):
+            first = None
+            for backend in backends:
+                s = load_backend(backend)([list(row) for row in rows],
+                                          player if turn == 'r' else computer)
+                result = tablebase_walk(s, d, table)
+                if first is None:
+                    first = result
+                status = "ok" if result == first else "DIFF"
+                failed += status != "ok"
+                print("%-15s %-10s %2d %10d %14.1f %-5s"
+                      % (backend, name, d, result[0], result[1], status))
+    return failed
+
+
+def check_eval(backends, positions, depth):
+    """
+        Score every position perft reaches with each backend's eval() and
+        check the values against EVAL_DIGESTS, bit for bit
+        :return: the number of wrong digests
+        :rtype: int
+    """
+    failed = 0
+    for name, rows, turn, expected in positions:
+        digests = EVAL_DIGESTS[name]
+        for d in range(1, min(depth, len(digests)) + 1):
+            for backend in backends:
+                s = load_backend(backend)([list(row) for row in rows],
+                                          player if turn == 'r' else computer)
+                values = []
+                eval_values(s, d, values)
+                digest = eval_digest(values)
+                status = "ok" if digest == digests[d - 1] else "WRONG"
+                failed += status != "ok"
+                print("%-15s %-10s %2d %12s %12s %-5s"
+                      % (backend, name, d, digest, digests[d - 1], status))
+    return failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--backend",
+        action="append",
+        help="Move generator to test: list, list-successors, bitboard, "
+             "inplace or module:function. Can be given more than once "
+             "(default all four)."
+    )
+    parser.add_argument(
+        "--depth",
+        type=int,
+        default=6,
+        help="Deepest perft run for each position."
+    )
+    parser.add_argument(
+        "--position",
+        action="append",
+        choices=[name for name, rows, turn, expected in REFERENCE_POSITIONS],
+        help="Reference position to run (default all)."
+    )
+    parser.add_argument(
+        "--tablebase",
+        type=str,
+        default=None,
+        help="Also probe this tablebase at every position reached and "
+             "check that all the backends get the same values."
+    )
+    parser.add_argument(
+        "--eval",
+        action="store_true",
+        help="Also check that eval() scores every position reached exactly "
+             "as the original engine did, under the built-in weights."
+    )
+    args = parser.parse_args()
+    positions = [position for position in REFERENCE_POSITIONS
+                 if args.position is None or position[0] in args.position]
+    print("%-15s %-10s %2s %10s %10s %-5s %8s %10s"
+          % ("backend", "position", "d", "nodes", "expected", "check",
+             "seconds", "nodes/s"))
+    failed = 0
+    for backend in args.backend or list(BACKENDS):
+        failed += run(backend, positions, args.depth)
+    if args.tablebase is not None:
+        print("%-15s %-10s %2s %10s %14s %-5s"
+              % ("backend", "position", "d", "tb hits", "tb values",
+                 "check"))
+        failed += check_tablebase(args.backend or list(BACKENDS), positions,
+                                  args.depth, Tablebase(args.tablebase))
+    if args.eval:
+        print("%-15s %-10s %2s %12s %12s %-5s"
+              % ("backend", "position", "d", "eval digest", "expected",
+                 "check"))
+        failed += check_eval(args.backend or list(BACKENDS), positions,
+                             args.depth)
+    sys.exit(1 if failed else 0)
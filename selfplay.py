@@ -0,0 +1,241 @@
+import argparse
+import multiprocessing
+import os
+import random
+import struct
+import sys
+import time
+
+import checkers
+from checkers import Board, load_eval_weights, make_state, play_game, \
+    player, reset_search
+
+# Self-play position generator. Each game starts from the opening position
+# with --random-plies random moves, so games differ, and is then played out
+# by the engine at --depth under the usual draw rules. Games are shared out
+# across --jobs worker processes. Every position a game reaches is written
+# to the positions file with the game's result once the game is over, the
+# training data of tune.py.
+
+# Positions file: a header, then one record per position, game after game
+GAMES_MAGIC = b'CKSP'
+GAMES_VERSION = 1
+GAMES_HEADER = struct.Struct('<4sBBxx')  # magic, version, record size
+# red men, red kings, black men and black kings masks, flags, then the
+# result for red: 1 won, 0 drawn, -1 lost
+GAMES_RECORD = struct.Struct('<4IBb')
+FLAG_BLACK_TO_MOVE = 1
+FLAG_JUMP = 2  # the side to move has to jump, so the position is not quiet
+RESULTS = {"1-0": 1, "1/2-1/2": 0, "0-1": -1}
+
+selfplay_args = None  # the command line, set in each worker
+
+
+class GameRecorder:
+    # Game writer of checkers.record for self-play: packs every position
+    # of the game, and gives them the result once it is known.
+    def __init__(self):
+        self.positions = []
+        self.plies = -1
+        self.result = None
+
+    def add(self, state):
+        move = next(iter(state.iter_moves()), None)
+        flags = (FLAG_BLACK_TO_MOVE if state.cur_turn != player else 0) | \
+            (FLAG_JUMP if move is not None and move.captured else 0)
+        self.positions.append((state.red_men, state.red_kings,
+                               state.black_men, state.black_kings, flags))
+        self.plies += 1
+
+    def finish(self, final_state):
+        self.result = RESULTS[checkers.game_result(final_state)]
+
+    def records(self):
+        """
+            Returns the positions of the finished game packed as
+            GAMES_RECORD
+            :rtype: bytes
+        """
+        return b''.join(GAMES_RECORD.pack(*(position + (self.result,)))
+                        for position in self.positions)
+
+
+def init_worker(args):
+    """
+        Pool initializer: every worker searches with the settings of the
+        command line
+    """
+    global selfplay_args
+    selfplay_args = args
+    if args.eval_weights is not None:
+        load_eval_weights(args.eval_weights)
+    checkers.max_depth = args.depth
+    checkers.move_ordering = True
+
+
+def play_selfplay_game(index):
+    """
+        Play game number index in the calling worker. The random opening
+        is seeded from --seed and index, and the search starts afresh, so a
+        game does not depend on the worker that plays it.
+        :return: the packed positions, the result for red and the plies
+        :rtype: Tuple[bytes, int, int]
+    """
+    args = selfplay_args
+    rng = random.Random(args.seed * 1000003 + index)
+    reset_search(args)
+    s = make_state([row[:] for row in Board], player, "bitboard")
+    for _ in range(args.random_plies):
+        moves = list(s.iter_moves())
+        if not moves:
+            break
+        s = s.play(rng.choice(moves))
+    recorder = GameRecorder()
+    checkers.game_writer = recorder
+    try:
+        play_game(s)
+    finally:
+        checkers.game_writer = None
+    return recorder.records(), recorder.result, recorder.plies
+
+
+def open_positions_file(filename, append):
+    """
+        Returns filename opened for writing positions: appended to when
+        append is set and it already holds positions, started afresh
+        otherwise
+        :rtype: BinaryIO
+    """
+    if append and os.path.exists(filename) and os.path.getsize(filename):
+        with open(filename, 'rb') as f:
+            header = f.read(GAMES_HEADER.size)
+        if len(header) < GAMES_HEADER.size or \
+                GAMES_HEADER.unpack(header) != (GAMES_MAGIC, GAMES_VERSION,
+                                                GAMES_RECORD.size):
+            raise ValueError("%s is not a positions file of this version"
+                             % filename)
+        return open(filename, 'ab')
+    f = open(filename, 'wb')
+    f.write(GAMES_HEADER.pack(GAMES_MAGIC, GAMES_VERSION, GAMES_RECORD.size))
+    return f
+
+
+def run(args):
+    """
+        Play args.games games across args.jobs processes, writing their
+        positions as each game finishes, and print progress and totals to
+        stderr
+    """
+    if args.jobs > 1:
+        pool = multiprocessing.Pool(args.jobs, init_worker, (args,))
+        games = pool.imap(play_selfplay_game, range(args.games))
+    else:
+        pool = None
+        init_worker(args)
+        games = map(play_selfplay_game, range(args.games))
+    start = time.time()
+    positions = 0
+    results = {1: 0, 0: 0, -1: 0}
+    with open_positions_file(args.outputfile, args.append) as f:
+        for played, (records, result, plies) in enumerate(games, 1):
+            f.write(records)
+            positions += len(records) // GAMES_RECORD.size
+            results[result] += 1
+            if played % args.report_every == 0:
+                f.flush()
+                elapsed = time.time() - start
+                print("%d games, %d positions, %.0f positions/s"
+                      % (played, positions, positions / max(elapsed, 1e-9)),
+                      file=sys.stderr)
+    if pool is not None:
+        pool.close()
+        pool.join()
+    elapsed = time.time() - start
+    print("%d games (%d red wins, %d draws, %d black wins), %d positions in "
+          "%.1f seconds (%.0f positions/s) with %d jobs"
+          % (args.games, results[1], results[0], results[-1], positions,
+             elapsed, positions / max(elapsed, 1e-9), args.jobs),
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--outputfile",
+        type=str,
+        required=True,
+        help="The positions file to write."
+    )
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="Add to the positions already in --outputfile."
+    )
+    parser.add_argument(
+        "--games",
+        type=int,
+        default=100,
+        help="Number of games to play."
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes playing games."
+    )
+    parser.add_argument(
+        "--depth",
+        type=int,
+        default=2,
+        help="Search depth of every move."
+    )
+    parser.add_argument(
+        "--random-plies",
+        type=int,
+        default=8,
+        help="Random moves played from the opening position before the "
+             "engine takes over."
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=1,
+        help="Seed of the random openings; the same seed plays the same "
+             "games."
+    )
+    parser.add_argument(
+        "--tt-size",
+        type=int,
+        default=4,
+        help="Transposition table size of each worker in MB."
+    )
+    parser.add_argument(
+        "--eval-weights",
+        type=str,
+        default=None,
+        help="JSON file of eval() weights the games are played with."
+    )
+    parser.add_argument(
+        "--report-every",
+        type=int,
+        default=100,
+        help="Print progress after every this many games."
+    )
+    parser.set_defaults(tt_policy="depth")
+    args = parser.parse_args()
+    if args.games < 1 or args.jobs < 1 or args.depth < 1 or \
+            args.report_every < 1:
+        parser.error("--games, --jobs, --depth and --report-every must be at "
+                     "least 1")
+    if args.random_plies < 0:
+        parser.error("--random-plies cannot be negative")
+    if args.eval_weights is not None:
+        try:
+            load_eval_weights(args.eval_weights)
+        except (OSError, ValueError) as e:
+            parser.error("cannot load --eval-weights: %s" % e)
+    try:
+        run(args)
+    except (OSError, ValueError) as e:
+        print("selfplay: %s" % e, file=sys.stderr)
+        sys.exit(1)
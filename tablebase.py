@@ -0,0 +1,145 @@
+import argparse
+import itertools
+import sys
+import time
+from collections import deque
+
+from checkers import BitState, BLACK_KING_ROW, RED_KING_ROW, TB_DRAW, \
+    TB_HEADER, TB_LOSS, TB_MAGIC, TB_RECORD, TB_VERSION, TB_WIN, computer, \
+    player, tablebase_key
+
+# Retrograde analysis of checkers endgames. Every position with at most
+# --pieces pieces (at least one per side) is enumerated with both sides to
+# move, its successors are generated with the bitboard move generator, and
+# results are propagated backwards from the positions where the side to move
+# has no move: a position is won if some move reaches a lost position, and
+# lost once every move reaches a won one. Whatever is left is a draw. A
+# position and its colour-flipped twin share a tablebase_key, so only one
+# of the two is solved and stored.
+
+
+def enumerate_positions(max_pieces):
+    """
+        Yield the masks of every legal placement of 2 to max_pieces pieces
+        with at least one piece per side. Men never stand on the row where
+        they would have been crowned.
+        :type max_pieces: int
+        :rtype: Iterator[Tuple[int, int, int, int]]
+    """
+    for count in range(2, max_pieces + 1):
+        for squares in itertools.combinations(range(32), count):
+            for kinds in itertools.product(range(4), repeat=count):
+                if min(kinds) > 1 or max(kinds) < 2:
+                    continue
+                masks = [0, 0, 0, 0]
+                for sq, kind in zip(squares, kinds):
+                    masks[kind] |= 1 << sq
+                if masks[0] & RED_KING_ROW or masks[2] & BLACK_KING_ROW:
+                    continue
+                yield tuple(masks)
+
+
+def successors(masks, red_to_move):
+    """
+        Returns the keys of the positions reachable in one move, and
+        whether some move captures the last opposing piece
+        :rtype: Tuple[Set[bytes], Boolean]
+    """
+    state = BitState(*(masks + (player if red_to_move else computer,)))
+    keys = set()
+    wins_outright = False
+    for move in state.iter_moves():
+        child = state.play(move)
+        if child.is_eliminated():
+            wins_outright = True
+            continue
+        keys.add(tablebase_key((child.red_men, child.red_kings,
+                                child.black_men, child.black_kings),
+                               not red_to_move))
+    return keys, wins_outright
+
+
+def solve(max_pieces):
+    """
+        Returns the result and distance in plies of every won or lost
+        position with at most max_pieces pieces, keyed by tablebase_key
+        :rtype: Dict[bytes, Tuple[int, int]]
+    """
+    keys = []
+    index = {}
+    for masks in enumerate_positions(max_pieces):
+        for red_to_move in (True, False):
+            key = tablebase_key(masks, red_to_move)
+            if key not in index:
+                index[key] = len(keys)
+                keys.append((masks, red_to_move))
+    predecessors = [[] for _ in keys]
+    remaining = [0] * len(keys)
+    result = [TB_DRAW] * len(keys)
+    distance = [0] * len(keys)
+    losses, wins = [], []
+    for i, (masks, red_to_move) in enumerate(keys):
+        children, wins_outright = successors(masks, red_to_move)
+        for child in children:
+            predecessors[index[child]].append(i)
+        remaining[i] = len(children)
+        if wins_outright:
+            result[i], distance[i] = TB_WIN, 1
+            wins.append(i)
+        elif not children:
+            result[i], distance[i] = TB_LOSS, 0
+            losses.append(i)
+    # positions leave the queue in order of distance, so the first win
+    # found for a position is the quickest and a loss is settled by its
+    # longest defence
+    queue = deque(losses + wins)
+    while queue:
+        j = queue.popleft()
+        for i in predecessors[j]:
+            if result[i] != TB_DRAW:
+                continue
+            if result[j] == TB_LOSS:
+                result[i], distance[i] = TB_WIN, distance[j] + 1
+                queue.append(i)
+            else:
+                remaining[i] -= 1
+                if not remaining[i]:
+                    result[i], distance[i] = TB_LOSS, distance[j] + 1
+                    queue.append(i)
+    return {tablebase_key(masks, red_to_move): (result[i], distance[i])
+            for i, (masks, red_to_move) in enumerate(keys)
+            if result[i] != TB_DRAW}
+
+
+def write_tablebase(filename, max_pieces, table):
+    """
+        Write the records of table sorted by key, see TB_RECORD
+    """
+    with open(filename, 'wb') as f:
+        f.write(TB_HEADER.pack(TB_MAGIC, TB_VERSION, max_pieces, len(table)))
+        for key in sorted(table):
+            f.write(TB_RECORD.pack(key, *table[key]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--pieces",
+        type=int,
+        default=3,
+        help="Largest number of pieces on the board covered by the table."
+    )
+    parser.add_argument(
+        "--outputfile",
+        type=str,
+        required=True,
+        help="The tablebase file to write."
+    )
+    args = parser.parse_args()
+    if args.pieces < 2:
+        parser.error("--pieces must be at least 2")
+    start = time.time()
+    table = solve(args.pieces)
+    write_tablebase(args.outputfile, args.pieces, table)
+    print("%d won or lost positions with up to %d pieces in %.1f seconds"
+          % (len(table), args.pieces, time.time() - start), file=sys.stderr)
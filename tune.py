@@ -0,0 +1,255 @@
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+from checkers import EVAL_WEIGHT_NAMES, batch_eval, encode_masks, \
+    eval_weights, load_eval_weights, make_batch_tables
+from selfplay import FLAG_JUMP, GAMES_HEADER, GAMES_MAGIC, GAMES_RECORD, \
+    GAMES_VERSION
+
+# Texel tuning of the eval() weights. eval() is a sum of weights times
+# features of the board, so each position of the selfplay.py file becomes
+# one row of features, worked out in batches with batch_eval and one unit
+# weight at a time. A game result is predicted as sigmoid(K * eval), K
+# being fitted first for the starting weights. The weights are then fitted
+# by minimising the squared error of those predictions with Adam over
+# mini-batches, and written as a JSON file for --eval-weights.
+
+# a GAMES_RECORD as a numpy record, to read the positions file in place
+RECORD_DTYPE = np.dtype([('masks', '<u4', (4,)), ('flags', 'u1'),
+                         ('result', 'i1')])
+
+
+def load_positions(filename):
+    """
+        Returns the positions of a selfplay.py file, memory mapped rather
+        than read. A last record cut short by a run still writing is left
+        out.
+        :rtype: numpy.memmap
+    """
+    with open(filename, 'rb') as f:
+        header = f.read(GAMES_HEADER.size)
+    if len(header) < GAMES_HEADER.size or \
+            GAMES_HEADER.unpack(header) != (GAMES_MAGIC, GAMES_VERSION,
+                                            GAMES_RECORD.size):
+        raise ValueError("%s is not a positions file of this version"
+                         % filename)
+    count = (os.path.getsize(filename) - GAMES_HEADER.size) // \
+        GAMES_RECORD.size
+    if not count:
+        raise ValueError("%s holds no positions" % filename)
+    return np.memmap(filename, dtype=RECORD_DTYPE, mode='r',
+                     offset=GAMES_HEADER.size, shape=(count,))
+
+
+def feature_rows(positions, keep_jumps, batch_size):
+    """
+        Returns the features of the positions, one row per position and
+        one column per EVAL_WEIGHT_NAMES weight, so that eval() is the row
+        times the weights, and the results as 0 lost, 0.5 drawn and 1 won
+        for red. Positions where the side to move has to jump are left out
+        unless keep_jumps is set.
+        :rtype: Tuple[numpy.ndarray, numpy.ndarray]
+    """
+    units = [make_batch_tables({other: float(other == name)
+                                for other in EVAL_WEIGHT_NAMES})
+             for name in EVAL_WEIGHT_NAMES]
+    features, results = [], []
+    for first in range(0, len(positions), batch_size):
+        batch = positions[first:first + batch_size]
+        if not keep_jumps:
+            batch = batch[(batch['flags'] & FLAG_JUMP) == 0]
+        codes = encode_masks(batch['masks'])
+        features.append(np.stack([batch_eval(codes, tables)
+                                  for tables in units], axis=1)
+                        .astype(np.float32))
+        results.append((batch['result'].astype(np.float32) + 1) / 2)
+    return np.concatenate(features), np.concatenate(results)
+
+
+def sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+def mean_error(features, results, weights, k):
+    """
+        Returns the mean squared error of the results predicted as
+        sigmoid(k * eval)
+        :rtype: float
+    """
+    return float(np.mean((sigmoid(k * (features @ weights)) - results) ** 2))
+
+
+def fit_k(features, results, weights):
+    """
+        Returns the K the results are best predicted with, searched by
+        golden section on its logarithm
+        :rtype: float
+    """
+    low, high = math.log(1e-4), math.log(10)
+    ratio = (math.sqrt(5) - 1) / 2
+    for _ in range(60):
+        a = high - ratio * (high - low)
+        b = low + ratio * (high - low)
+        if mean_error(features, results, weights, math.exp(a)) < \
+                mean_error(features, results, weights, math.exp(b)):
+            high = b
+        else:
+            low = a
+    return math.exp((low + high) / 2)
+
+
+def fit_weights(features, results, weights, k, args, fixed):
+    """
+        Returns the weights fitted with Adam over shuffled mini-batches of
+        args.batch_size positions for args.epochs passes, the weights in
+        fixed left alone. The error of each pass goes to stderr.
+        :rtype: numpy.ndarray
+    """
+    weights = weights.copy()
+    free = np.array([name not in fixed for name in EVAL_WEIGHT_NAMES])
+    first_moment = np.zeros_like(weights)
+    second_moment = np.zeros_like(weights)
+    beta1, beta2, epsilon = 0.9, 0.999, 1e-8
+    rng = np.random.default_rng(args.seed)
+    step = 0
+    for epoch in range(1, args.epochs + 1):
+        order = rng.permutation(len(results))
+        for first in range(0, len(order), args.batch_size):
+            rows = order[first:first + args.batch_size]
+            x, y = features[rows], results[rows]
+            predicted = sigmoid(k * (x @ weights))
+            # derivative of the mean squared error by each weight
+            gradient = x.T @ ((predicted - y) * predicted * (1 - predicted)) \
+                * (2 * k / len(rows))
+            step += 1
+            first_moment = beta1 * first_moment + (1 - beta1) * gradient
+            second_moment = beta2 * second_moment + (1 - beta2) * gradient ** 2
+            update = args.learning_rate * \
+                (first_moment / (1 - beta1 ** step)) / \
+                (np.sqrt(second_moment / (1 - beta2 ** step)) + epsilon)
+            weights -= np.where(free, update, 0)
+        print("epoch %d: error %.6f" % (epoch, mean_error(
+            features, results, weights, k)), file=sys.stderr)
+    return weights
+
+
+def run(args):
+    """
+        Fit the weights of args.inputfile and write them to args.outputfile
+    """
+    start = time.time()
+    positions = load_positions(args.inputfile)
+    features, results = feature_rows(positions, args.keep_jumps,
+                                     args.batch_size)
+    if not len(results):
+        raise ValueError("no positions left to fit")
+    print("%d positions of %d, features in %.1f seconds"
+          % (len(results), len(positions), time.time() - start),
+          file=sys.stderr)
+    initial = eval_weights()
+    weights = np.array([initial[name] for name in EVAL_WEIGHT_NAMES],
+                       dtype=np.float64)
+    k = fit_k(features, results, weights) if args.k is None else args.k
+    print("K %.6g, error %.6f" % (k, mean_error(features, results, weights,
+                                                k)), file=sys.stderr)
+    fitted = fit_weights(features, results, weights, k, args, set(args.fix))
+    # a feature no position has leaves its weight where it started
+    unused = ~features.any(axis=0)
+    print("%-20s %10s %10s" % ("weight", "start", "fitted"))
+    for name, before, after, no_data in zip(EVAL_WEIGHT_NAMES, weights,
+                                            fitted, unused):
+        print("%-20s %10.4f %10.4f%s" % (name, before, after,
+                                         "  (no data)" if no_data else ""))
+    with open(args.outputfile, 'w') as f:
+        json.dump({name: round(float(value), 6)
+                   for name, value in zip(EVAL_WEIGHT_NAMES, fitted)},
+                  f, indent=2)
+        f.write('\n')
+    print("fitted in %.1f seconds" % (time.time() - start), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--inputfile",
+        type=str,
+        required=True,
+        help="Positions file written by selfplay.py."
+    )
+    parser.add_argument(
+        "--outputfile",
+        type=str,
+        required=True,
+        help="JSON file the fitted weights are written to."
+    )
+    parser.add_argument(
+        "--eval-weights",
+        type=str,
+        default=None,
+        help="JSON file of the weights to start from (default the built-in "
+             "ones)."
+    )
+    parser.add_argument(
+        "--fix",
+        action="append",
+        default=[],
+        choices=EVAL_WEIGHT_NAMES,
+        help="Weight kept at its starting value. Can be given more than "
+             "once."
+    )
+    parser.add_argument(
+        "--k",
+        type=float,
+        default=None,
+        help="Scale of eval() in the predicted result (default fitted)."
+    )
+    parser.add_argument(
+        "--epochs",
+        type=int,
+        default=20,
+        help="Passes over the positions."
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=4096,
+        help="Positions per mini-batch, and per batch of features."
+    )
+    parser.add_argument(
+        "--learning-rate",
+        type=float,
+        default=0.01,
+        help="Adam step size."
+    )
+    parser.add_argument(
+        "--keep-jumps",
+        action="store_true",
+        help="Also fit positions where the side to move has to jump."
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=1,
+        help="Seed of the mini-batch order."
+    )
+    args = parser.parse_args()
+    if args.epochs < 1 or args.batch_size < 1:
+        parser.error("--epochs and --batch-size must be at least 1")
+    if args.k is not None and args.k <= 0:
+        parser.error("--k must be positive")
+    if args.eval_weights is not None:
+        try:
+            load_eval_weights(args.eval_weights)
+        except (OSError, ValueError) as e:
+            parser.error("cannot load --eval-weights: %s" % e)
+    try:
+        run(args)
+    except (OSError, ValueError) as e:
+        print("tune: %s" % e, file=sys.stderr)
+        sys.exit(1)